@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyppeteer.codec import available_codecs, get_codec  # noqa: E402
+
+# A synthetic page load: the frames a navigation with a few dozen
+# subresources produces, laid out compactly the way Chrome sends them.
+DEFAULT_TRACE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'traces', 'page_load.jsonl')
+
+
+def load_trace(path):
+    # One raw websocket frame per line, as received from the browser.
+    with open(path, 'rb') as fl:
+        return [line.rstrip(b'\n') for line in fl if line.strip()]
+
+
+def replay(codec, frames):
+    for frame in frames:
+        data = codec.loads(frame)
+        if data.get('method') == 'Target.receivedMessageFromTarget':
+            data['params']['message'] = codec.loads(
+                data['params']['message'])
+        codec.dumps(data)
+
+
+def bench(name, frames, rounds):
+    codec = get_codec(name)
+    replay(codec, frames)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        replay(codec, frames)
+    elapsed = time.perf_counter() - start
+    total = len(frames) * rounds
+    print('{:8} {:8.3f}s {:10.0f} msg/s {:8.2f} us/msg'.format(
+        name, elapsed, total / elapsed, elapsed * 1e6 / total))
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_TRACE
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    frames = load_trace(path)
+    size = sum(len(frame) for frame in frames)
+    print('Replaying {} frames ({} KB) x {} rounds'.format(
+        len(frames), size // 1024, rounds))
+    for name in available_codecs():
+        bench(name, frames, rounds)
+
+
+if __name__ == '__main__':
+    main()
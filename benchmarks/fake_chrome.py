@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""Stand-in for the Chrome executable used by the benchmarks.
+
+Serves just enough of the DevTools protocol over a websocket for pyppeteer
+to launch, open pages, navigate and take screenshots, and prints the
+``DevTools listening on`` line to stderr like Chrome does.
+
+Extra flags (pass them through the launch ``args`` option):
+
+    --fake-startup-delay=SECONDS   simulate Chrome's boot time
+    --fake-subresources=N          requests emitted per navigation
+    --fake-latency=SECONDS         delay before answering each command
+"""
+import asyncio
+import base64
+import json
+import sys
+import uuid
+
+import websockets
+
+PNG_1X1 = base64.b64encode(bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000d49444154789c6360000002000001e221bc33'
+    '0000000049454e44ae426082'
+)).decode('ascii')
+
+
+def dumps(obj):
+    # Match Chrome's compact framing.
+    return json.dumps(obj, separators=(',', ':'))
+
+
+def flag(name, default, cast=float):
+    prefix = '--{}='.format(name)
+    for arg in sys.argv[1:]:
+        if arg.startswith(prefix):
+            return cast(arg[len(prefix):])
+    return default
+
+
+class FakeTarget(object):
+
+    def __init__(self, target_id):
+        self.target_id = target_id
+        self.frame_id = target_id + '.1'
+        self.loader_id = 0
+        self.context_id = 0
+        self.request_id = 0
+        self.url = 'about:blank'
+
+
+class FakeBrowser(object):
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.targets = {}
+        self.sessions = {}
+        self.flat = set()
+        self.latency = flag('fake-latency', 0)
+        self.subresources = flag('fake-subresources', 0, int)
+
+    async def send(self, message):
+        await self.ws.send(dumps(message))
+
+    async def send_to_session(self, session_id, message):
+        if session_id in self.flat:
+            message['sessionId'] = session_id
+            await self.send(message)
+        else:
+            await self.send({
+                'method': 'Target.receivedMessageFromTarget',
+                'params': {
+                    'sessionId': session_id,
+                    'message': dumps(message),
+                    'targetId': self.sessions[session_id].target_id,
+                },
+            })
+
+    async def handle(self, raw):
+        message = json.loads(raw)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if 'sessionId' in message:
+            await self.handle_session(message['sessionId'], message)
+            return
+        method = message['method']
+        params = message.get('params', {})
+        result = {}
+        events = []
+        if method == 'Browser.getVersion':
+            result = {'product': 'FakeChrome/64.0.0.0'}
+        elif method == 'Target.createTarget':
+            target_id = uuid.uuid4().hex.upper()
+            self.targets[target_id] = FakeTarget(target_id)
+            result = {'targetId': target_id}
+        elif method == 'Target.attachToTarget':
+            session_id = uuid.uuid4().hex.upper()
+            self.sessions[session_id] = self.targets[params['targetId']]
+            if params.get('flatten'):
+                self.flat.add(session_id)
+            result = {'sessionId': session_id}
+        elif method == 'Target.closeTarget':
+            target = self.targets.pop(params['targetId'], None)
+            result = {'success': target is not None}
+            for session_id, owner in list(self.sessions.items()):
+                if owner is target:
+                    del self.sessions[session_id]
+                    events.append({
+                        'method': 'Target.detachedFromTarget',
+                        'params': {'sessionId': session_id},
+                    })
+        elif method == 'Target.sendMessageToTarget':
+            await self.send({'id': message['id'], 'result': {}})
+            await self.handle_session(
+                params['sessionId'], json.loads(params['message']))
+            return
+        await self.send({'id': message['id'], 'result': result})
+        for event in events:
+            await self.send(event)
+
+    async def handle_session(self, session_id, message):
+        target = self.sessions.get(session_id)
+        if not target:
+            return
+        method = message['method']
+        params = message.get('params', {})
+        result = {}
+        events = []
+        if method == 'Page.navigate':
+            target.loader_id += 1
+            target.url = params['url']
+            loader_id = '{}.{}'.format(target.target_id, target.loader_id)
+            result = {'frameId': target.frame_id, 'loaderId': loader_id}
+            events = self.navigation_events(target, loader_id)
+        elif method == 'Page.reload':
+            target.loader_id += 1
+            loader_id = '{}.{}'.format(target.target_id, target.loader_id)
+            events = self.navigation_events(target, loader_id)
+        elif method == 'Page.getLayoutMetrics':
+            result = {
+                'layoutViewport': {
+                    'pageX': 0, 'pageY': 0,
+                    'clientWidth': 800, 'clientHeight': 600,
+                },
+                'contentSize': {
+                    'x': 0, 'y': 0, 'width': 800, 'height': 4000,
+                },
+            }
+        elif method == 'Page.captureScreenshot':
+            result = {'data': PNG_1X1}
+        elif method == 'Runtime.evaluate':
+            result = {'result': {'type': 'undefined'}}
+        await self.send_to_session(
+            session_id, {'id': message['id'], 'result': result})
+        for event in events:
+            await self.send_to_session(session_id, event)
+
+    def navigation_events(self, target, loader_id):
+        # Chrome reuses the loader id as the document's request id.
+        request_id = loader_id
+        events = [
+            network_event('requestWillBeSent', request_id, target.url,
+                          'Document', loader_id, target.frame_id),
+            network_event('responseReceived', request_id, target.url,
+                          'Document', loader_id, target.frame_id),
+            network_event('loadingFinished', request_id),
+            {
+                'method': 'Page.domContentEventFired',
+                'params': {'timestamp': 1000.1},
+            },
+            {
+                'method': 'Page.frameNavigated',
+                'params': {'frame': {
+                    'id': target.frame_id,
+                    'loaderId': loader_id,
+                    'url': target.url,
+                    'securityOrigin': target.url,
+                    'mimeType': 'text/html',
+                }},
+            },
+        ]
+        target.context_id += 1
+        events.append({
+            'method': 'Runtime.executionContextCreated',
+            'params': {'context': {
+                'id': target.context_id,
+                'origin': target.url,
+                'name': '',
+                'auxData': {'isDefault': True, 'frameId': target.frame_id},
+            }},
+        })
+        for index in range(self.subresources):
+            target.request_id += 1
+            request_id = '{}.r{}'.format(target.target_id, target.request_id)
+            url = '{}/asset-{}.js'.format(target.url.rstrip('/'), index)
+            events.append(network_event(
+                'requestWillBeSent', request_id, url, 'Script', loader_id,
+                target.frame_id))
+            events.append(network_event(
+                'responseReceived', request_id, url, 'Script', loader_id,
+                target.frame_id))
+            events.append(network_event('dataReceived', request_id))
+            events.append(network_event('loadingFinished', request_id))
+        events.append({
+            'method': 'Page.loadEventFired',
+            'params': {'timestamp': 1000.2},
+        })
+        return events
+
+
+def network_event(
+        name, request_id, url=None, resource_type=None, loader_id=None,
+        frame_id=None):
+    params = {'requestId': request_id, 'timestamp': 1000.0}
+    if name == 'requestWillBeSent':
+        params.update({
+            'loaderId': loader_id,
+            'documentURL': url,
+            'request': {'url': url, 'method': 'GET', 'headers': {}},
+            'wallTime': 1518000000.0,
+            'initiator': {'type': 'other'},
+            'type': resource_type,
+            'frameId': frame_id,
+        })
+    elif name == 'responseReceived':
+        params.update({
+            'loaderId': loader_id,
+            'type': resource_type,
+            'frameId': frame_id,
+            'response': {
+                'url': url,
+                'status': 200,
+                'statusText': 'OK',
+                'headers': {'content-type': 'text/html'},
+                'mimeType': 'text/html',
+                'encodedDataLength': 120,
+            },
+        })
+    elif name == 'dataReceived':
+        params.update({'dataLength': 1024, 'encodedDataLength': 0})
+    elif name == 'loadingFinished':
+        params['encodedDataLength'] = 1024
+    return {'method': 'Network.' + name, 'params': params}
+
+
+async def serve(ws, path=None):
+    browser = FakeBrowser(ws)
+    try:
+        async for raw in ws:
+            if browser.latency:
+                asyncio.ensure_future(browser.handle(raw))
+            else:
+                await browser.handle(raw)
+    except websockets.ConnectionClosed:
+        pass
+
+
+async def main():
+    await asyncio.sleep(flag('fake-startup-delay', 0))
+    server = await websockets.serve(serve, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    sys.stderr.write('DevTools listening on ws://127.0.0.1:{}/devtools/'
+                     'browser/{}\n'.format(port, uuid.uuid4()))
+    sys.stderr.flush()
+    await asyncio.Future()
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.get_event_loop().run_until_complete(main())
+    except KeyboardInterrupt:
+        pass
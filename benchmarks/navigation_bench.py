@@ -0,0 +1,65 @@
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyppeteer.launcher import Launcher  # noqa: E402
+from pyppeteer.loop import loop  # noqa: E402
+
+FAKE_CHROME = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'fake_chrome.py')
+
+
+def launch_options(latency, subresources):
+    return {
+        'executablePath': FAKE_CHROME,
+        'args': [
+            '--fake-latency={}'.format(latency),
+            '--fake-subresources={}'.format(subresources),
+        ],
+    }
+
+
+async def navigate(page, count, timings):
+    for index in range(count):
+        start = time.perf_counter()
+        await page.goto('http://localhost/{}'.format(index))
+        timings.append(time.perf_counter() - start)
+
+
+async def run(options, pages, navigations):
+    browser = await Launcher.launch(options)
+    opened = await asyncio.gather(*[browser.new_page() for _ in range(pages)])
+    timings = []
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        navigate(page, navigations, timings) for page in opened
+    ])
+    elapsed = time.perf_counter() - start
+    await browser.close()
+    return elapsed, timings
+
+
+def report(pages, elapsed, timings):
+    timings = sorted(timings)
+    print('pages={:<3} navs={:<5} {:8.1f} nav/s p50={:7.1f}ms '
+          'p95={:7.1f}ms'.format(
+              pages, len(timings), len(timings) / elapsed,
+              1000 * timings[len(timings) // 2],
+              1000 * timings[int(len(timings) * 0.95)]))
+
+
+def main():
+    navigations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.005
+    options = launch_options(latency, 5)
+    for pages in (1, 4, 16):
+        elapsed, timings = loop.run_until_complete(
+            run(options, pages, navigations))
+        report(pages, elapsed, timings)
+
+
+if __name__ == '__main__':
+    main()
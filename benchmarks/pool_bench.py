@@ -0,0 +1,75 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyppeteer.browser_pool import BrowserPool  # noqa: E402
+from pyppeteer.launcher import Launcher  # noqa: E402
+from pyppeteer.loop import loop  # noqa: E402
+
+FAKE_CHROME = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'fake_chrome.py')
+
+
+def launch_options(startup_delay):
+    return {
+        'executablePath': FAKE_CHROME,
+        'args': ['--fake-startup-delay={}'.format(startup_delay)],
+    }
+
+
+async def open_first_page(browser):
+    # Time to an attached page target; that is where launch cost ends and
+    # per-page work that both strategies share begins.
+    connection = browser._connection
+    result = await connection.send('Target.createTarget', {
+        'url': 'about:blank'
+    })
+    session = await connection.create_session(result['targetId'])
+    await session.dispose()
+
+
+async def cold(jobs, options):
+    timings = []
+    for _ in range(jobs):
+        start = time.perf_counter()
+        browser = await Launcher.launch(options)
+        await open_first_page(browser)
+        timings.append(time.perf_counter() - start)
+        await browser.close()
+    return timings
+
+
+async def pooled(jobs, options, size):
+    timings = []
+    pool = BrowserPool(options, size=size)
+    await pool.start()
+    for _ in range(jobs):
+        start = time.perf_counter()
+        async with pool.acquire() as browser:
+            await open_first_page(browser)
+            timings.append(time.perf_counter() - start)
+    await pool.close()
+    return timings
+
+
+def report(name, timings):
+    timings = sorted(timings)
+    print('{:6} n={:<4} mean={:7.1f}ms p50={:7.1f}ms p95={:7.1f}ms'.format(
+        name, len(timings),
+        1000 * sum(timings) / len(timings),
+        1000 * timings[len(timings) // 2],
+        1000 * timings[int(len(timings) * 0.95)]))
+
+
+def main():
+    jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    startup_delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+    options = launch_options(startup_delay)
+    report('cold', loop.run_until_complete(cold(jobs, options)))
+    report('pool', loop.run_until_complete(pooled(jobs, options, 2)))
+
+
+if __name__ == '__main__':
+    main()
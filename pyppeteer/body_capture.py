@@ -0,0 +1,132 @@
+import asyncio
+import fnmatch
+import os
+import re
+import shutil
+import tempfile
+
+from pyppeteer.emitter import EventEmitter
+from pyppeteer.helper import Helper
+
+
+class BodyCapture(EventEmitter):
+
+    Events = {
+        'Body': 'body',
+        'BodyFailed': 'bodyfailed',
+    }
+
+    # Options:
+    #   'mimeTypes': mime type globs to capture, e.g. ['application/json']
+    #   'urls': URL regexes to capture
+    #   'maxSize': skip bodies larger than this many bytes
+    #   'concurrency': Network.getResponseBody calls in flight at once
+    #   'spillSize': bodies larger than this many bytes go to 'spillDir'
+    #   'spillDir': defaults to a fresh temporary directory
+    def __init__(self, network_manager, options={}):
+        super().__init__()
+        self._network_manager = network_manager
+        self._mime_types = list(
+            options['mimeTypes'] if 'mimeTypes' in options else ())
+        self._urls = None
+        if 'urls' in options and options['urls']:
+            self._urls = re.compile('|'.join(
+                '(?:{})'.format(getattr(url, 'pattern', url))
+                for url in options['urls']
+            ))
+        self._max_size = options['maxSize'] if 'maxSize' in options else None
+        self._spill_size = options['spillSize'] \
+            if 'spillSize' in options else None
+        self._spill_dir = options['spillDir'] \
+            if 'spillDir' in options else None
+        self._owns_spill_dir = False
+        self._semaphore = asyncio.Semaphore(
+            options['concurrency'] if 'concurrency' in options else 8)
+        self._pending = set()
+        self._listener = None
+
+    def start(self):
+        # Chrome drops response bodies on navigation, so they are fetched as
+        # soon as each request finishes rather than when someone asks.
+        self._listener = Helper.add_event_listener(
+            self._network_manager,
+            self._network_manager.Events['RequestFinished'],
+            self._on_request_finished
+        )
+
+    def stop(self):
+        if self._listener:
+            Helper.remove_event_listeners([self._listener])
+            self._listener = None
+
+    async def close(self):
+        # Stops capturing and removes the spill directory if this capture
+        # made it; bodies spilled there can't be read back afterwards.
+        self.stop()
+        for future in list(self._pending):
+            future.cancel()
+        if self._pending:
+            await asyncio.wait(list(self._pending))
+        if self._owns_spill_dir:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+            self._owns_spill_dir = False
+
+    def pending(self):
+        return len(self._pending)
+
+    async def drain(self):
+        while self._pending:
+            await asyncio.wait(list(self._pending))
+
+    def _wants(self, request, response):
+        if self._max_size is not None and \
+                request._encoded_data_length is not None and \
+                request._encoded_data_length > self._max_size:
+            return False
+        if self._mime_types and not any(
+                fnmatch.fnmatch(response.mime_type or '', mime_type)
+                for mime_type in self._mime_types):
+            return False
+        if self._urls and not self._urls.search(response.url):
+            return False
+        return True
+
+    def _on_request_finished(self, request):
+        response = request.response()
+        # Redirects finish with the redirect response; their body is empty.
+        if not response or response.status in (301, 302, 303, 307, 308):
+            return
+        if not self._wants(request, response):
+            return
+        future = asyncio.ensure_future(self._capture(response))
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+
+    async def _capture(self, response):
+        async with self._semaphore:
+            try:
+                body = await response.buffer()
+            except Exception:
+                self.emit(BodyCapture.Events['BodyFailed'], response)
+                return
+        if self._max_size is not None and len(body) > self._max_size:
+            response._content_promise = None
+            return
+        if self._spill_size is not None and len(body) > self._spill_size:
+            self._spill(response, body)
+        self.emit(BodyCapture.Events['Body'], response)
+
+    def _spill(self, response, body):
+        if not self._spill_dir:
+            self._spill_dir = tempfile.mkdtemp(prefix='pyppeteer_bodies_')
+            self._owns_spill_dir = True
+        path = os.path.join(
+            self._spill_dir,
+            re.sub(r'[^\w.-]', '_', response.request()._request_id))
+        with open(path, 'wb') as fl:
+            fl.write(body)
+        # Later buffer() calls read the file back instead of keeping the
+        # body in memory.
+        response._body_path = path
+        response._content_promise = None
@@ -1,30 +1,24 @@
 import asyncio
 from pyppeteer.page import Page
-
-
-class TaskQueue(object):
-
-    def __init__(self):
-        self.chain = asyncio.Queue()
-        # asyncio.async(self._start_consumer())
-
-    async def _start_consumer(self):
-        print('Started ss tq')
-        while True:
-            future = await self.chain.get()
-            await future
-
-    async def post_task(self, task):
-        print(task)
-        await self.chain.put(task)
+from pyppeteer.screenshot_scheduler import ScreenshotScheduler
 
 
 class Browser(object):
 
-    def __init__(self, connection, ignore_https_errors, close_cb):
+    def __init__(
+            self, connection, ignore_https_errors, close_cb,
+            lazy_domains=False, process=None, page_pool_size=0,
+            screenshot_concurrency=4):
         self._ignore_https_errors = ignore_https_errors
-        self._screenshot_task_queue = TaskQueue()
+        self._lazy_domains = lazy_domains
+        self._screenshot_task_queue = ScreenshotScheduler(
+            screenshot_concurrency)
         self._connection = connection
+        self._process = process
+        # Pages handed out, fresh or reused from the page pool.
+        self._pages_used = 0
+        self._page_pool_size = page_pool_size
+        self._idle_pages = []
 
         def cb():
             pass
@@ -33,20 +27,61 @@ class Browser(object):
     def ws_endpoint(self):
         return self._connection.url()
 
+    def process(self):
+        return self._process
+
+    def screenshot_metrics(self):
+        return self._screenshot_task_queue.metrics()
+
     async def new_page(self):
+        self._pages_used += 1
+        return await self._create_page()
+
+    async def _create_page(self):
         result = await self._connection.send('Target.createTarget', {
             'url': 'about:blank'
         })
         client = await self._connection.create_session(result['targetId'])
         return await Page.create(
             client, self._ignore_https_errors,
-            self._screenshot_task_queue
+            self._screenshot_task_queue, self._lazy_domains
         )
 
+    async def fill_page_pool(self):
+        missing = self._page_pool_size - len(self._idle_pages)
+        if missing <= 0:
+            return
+        pages = await asyncio.gather(*[
+            self._create_page() for _ in range(missing)
+        ])
+        self._idle_pages.extend(pages)
+
+    async def acquire_page(self):
+        while self._idle_pages:
+            page = self._idle_pages.pop()
+            if not page.is_closed():
+                self._pages_used += 1
+                return page
+        return await self.new_page()
+
+    async def release_page(self, page):
+        if page.is_closed():
+            return
+        if len(self._idle_pages) >= self._page_pool_size:
+            await page.close()
+            return
+        try:
+            await page._reset()
+        except Exception:
+            await page.close()
+            return
+        self._idle_pages.append(page)
+
     async def version(self):
         version = await self._connection.send('Browser.getVersion')
         return version['product']
 
     async def close(self):
+        self._idle_pages.clear()
         self._connection.dispose()
         self._close_cb()
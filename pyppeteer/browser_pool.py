@@ -0,0 +1,179 @@
+import asyncio
+import os
+
+from pyppeteer.launcher import Launcher
+from pyppeteer.loop import loop as asyncio_loop
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def process_tree_rss(pid):
+    if psutil:
+        try:
+            process = psutil.Process(pid)
+            processes = [process] + process.children(recursive=True)
+            return sum(proc.memory_info().rss for proc in processes)
+        except psutil.Error:
+            return None
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    rss = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open('/proc/{}/statm'.format(current)) as fl:
+                rss += int(fl.read().split()[1]) * page_size
+            with open('/proc/{0}/task/{0}/children'.format(current)) as fl:
+                pending.extend(int(child) for child in fl.read().split())
+        except (OSError, ValueError, IndexError):
+            if current == pid:
+                return None
+    return rss
+
+
+class PooledBrowser(object):
+
+    def __init__(self, pool):
+        self._pool = pool
+        self._browser = None
+
+    def __await__(self):
+        return self._pool._acquire().__await__()
+
+    async def __aenter__(self):
+        self._browser = await self._pool._acquire()
+        return self._browser
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._pool.release(self._browser)
+        self._browser = None
+
+
+class BrowserPool(object):
+
+    def __init__(
+            self, options={}, size=2, max_pages=None, max_rss=None,
+            loop=asyncio_loop):
+        self._options = options
+        self._size = size
+        self._max_pages = max_pages
+        self._max_rss = max_rss
+        self._loop = loop
+
+        self._idle = asyncio.Queue()
+        self._browsers = set()
+        self._watchers = {}
+        self._launching = 0
+        self._waiting = 0
+        self._closed = False
+
+    async def start(self):
+        await asyncio.gather(*[
+            self._launch() for _ in range(self._size - len(self._browsers))
+        ])
+
+    def acquire(self):
+        return PooledBrowser(self)
+
+    async def release(self, browser):
+        if browser not in self._browsers:
+            return
+        if self._closed or self._should_recycle(browser):
+            await self._retire(browser)
+            self._fill()
+            return
+        self._idle.put_nowait(browser)
+
+    def size(self):
+        return len(self._browsers)
+
+    def idle_count(self):
+        return self._idle.qsize()
+
+    async def close(self):
+        self._closed = True
+        browsers = list(self._browsers)
+        await asyncio.gather(*[self._retire(browser) for browser in browsers])
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _acquire(self):
+        assert not self._closed, 'Browser pool is closed'
+        while True:
+            if self._idle.empty():
+                self._fill()
+            self._waiting += 1
+            try:
+                browser = await self._idle.get()
+            finally:
+                self._waiting -= 1
+            if isinstance(browser, Exception):
+                raise browser
+            if browser in self._browsers:
+                return browser
+
+    def _should_recycle(self, browser):
+        if self._max_pages and browser._pages_used >= self._max_pages:
+            return True
+        process = browser.process()
+        if self._max_rss and process:
+            rss = process_tree_rss(process.pid)
+            if rss and rss > self._max_rss:
+                return True
+        return False
+
+    def _fill(self):
+        if self._closed:
+            return
+        missing = self._size - len(self._browsers) - self._launching
+        for _ in range(missing):
+            future = asyncio.ensure_future(self._launch())
+            future.add_done_callback(
+                lambda fut: fut.cancelled() or fut.exception())
+
+    async def _launch(self):
+        self._launching += 1
+        try:
+            browser = await Launcher.launch(self._options, loop=self._loop)
+        except Exception as e:
+            # Fail the acquirers waiting for a browser instead of leaving
+            # them blocked on one that is never coming.
+            for _ in range(self._waiting - self._idle.qsize()):
+                self._idle.put_nowait(e)
+            raise
+        finally:
+            self._launching -= 1
+        if self._closed:
+            await browser.close()
+            return
+        self._browsers.add(browser)
+        if browser.process():
+            self._watchers[browser] = asyncio.ensure_future(
+                self._watch(browser))
+        self._idle.put_nowait(browser)
+
+    async def _watch(self, browser):
+        await browser.process().wait()
+        if browser not in self._browsers:
+            return
+        # Chrome went away while the browser was still owned by the pool;
+        # drop it and launch a replacement in the background.
+        self._browsers.discard(browser)
+        self._watchers.pop(browser, None)
+        await browser.close()
+        self._fill()
+
+    async def _retire(self, browser):
+        self._browsers.discard(browser)
+        watcher = self._watchers.pop(browser, None)
+        if watcher:
+            watcher.cancel()
+        await browser.close()
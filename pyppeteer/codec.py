@@ -0,0 +1,79 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+class JSONCodec(object):
+    # Chrome's DevTools websocket only accepts text frames, so `dumps`
+    # returns str; `loads` takes either the str or bytes frame as received.
+
+    name = 'json'
+
+    def dumps(self, obj):
+        return json.dumps(obj)
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class UJSONCodec(JSONCodec):
+
+    name = 'ujson'
+
+    def dumps(self, obj):
+        return ujson.dumps(
+            obj, ensure_ascii=False, escape_forward_slashes=False)
+
+    def loads(self, data):
+        try:
+            return ujson.loads(data)
+        except ValueError:
+            return json.loads(data)
+
+
+class ORJSONCodec(JSONCodec):
+
+    name = 'orjson'
+
+    def dumps(self, obj):
+        return orjson.dumps(obj).decode('utf-8')
+
+    def loads(self, data):
+        try:
+            return orjson.loads(data)
+        except ValueError:
+            # Chrome can send strings holding lone surrogates, e.g. from
+            # an evaluate result, which orjson rejects and json accepts.
+            return json.loads(data)
+
+
+CODECS = {
+    'json': (JSONCodec, json),
+    'ujson': (UJSONCodec, ujson),
+    'orjson': (ORJSONCodec, orjson),
+}
+
+
+def available_codecs():
+    return [name for name, (_, module) in CODECS.items() if module]
+
+
+def get_codec(name=None):
+    if isinstance(name, JSONCodec):
+        return name
+    if name is None:
+        return JSONCodec()
+    if name not in CODECS:
+        raise Exception('Unknown JSON codec: {}'.format(name))
+    codec_class, module = CODECS[name]
+    if not module:
+        raise Exception('JSON codec {} is not installed'.format(name))
+    return codec_class()
@@ -1,26 +1,46 @@
 import asyncio
-import json
+import re
 
 import websockets.client as wsclient
 from websockets.exceptions import ConnectionClosed
 
+from pyppeteer.codec import get_codec
 from pyppeteer.emitter import EventEmitter
 from pyppeteer.loop import loop as asyncio_loop
 
+# Chrome serializes frames with a stable key order, which lets us read the
+# routing fields of an event without decoding the whole payload. Anything
+# that doesn't match these shapes goes through the full decode.
+EVENT_METHOD = re.compile(r'\{"method":"([^"]+)"')
+FLAT_SESSION_ID = re.compile(r'"sessionId":"([^"]+)"\}$')
+TARGET_MESSAGE = re.compile(
+    r'\{"method":"Target\.receivedMessageFromTarget",'
+    r'"params":\{"sessionId":"([^"]+)",'
+    r'"message":"\{\\"method\\":\\"([^"\\]+)\\"'
+)
+CONNECTION_EVENTS = (
+    'Target.receivedMessageFromTarget',
+    'Target.detachedFromTarget',
+)
+
 
 class Connection(EventEmitter):
 
     @staticmethod
-    async def create(url, delay=0, loop=asyncio_loop):
+    async def create(
+            url, delay=0, loop=asyncio_loop, flatten=False, codec=None):
         future = asyncio.Future()
         try:
             ws = await wsclient.connect(url)
-            future.set_result(Connection(url, ws, delay, loop=loop))
+            future.set_result(Connection(
+                url, ws, delay, loop=loop, flatten=flatten, codec=codec))
         except Exception as e:
             future.set_exception(e)
         return await future
 
-    def __init__(self, url, ws, delay=0, loop=asyncio_loop):
+    def __init__(
+            self, url, ws, delay=0, loop=asyncio_loop, flatten=False,
+            codec=None):
         super().__init__()
         self._url = url
         self._last_id = 0
@@ -29,8 +49,12 @@ class Connection(EventEmitter):
         self._ws = ws
         self._sessions = {}
         self._loop = loop
+        # In flat mode sessions talk to their targets directly over this
+        # websocket by tagging messages with a top-level sessionId.
+        self._flatten = flatten
+        self._codec = get_codec(codec)
 
-        asyncio.async(self._listen_for_msg())
+        asyncio.ensure_future(self._listen_for_msg())
         # print('Got it')
 
     async def _listen_for_msg(self):
@@ -38,38 +62,84 @@ class Connection(EventEmitter):
             try:
                 message = await self._ws.recv()
             except ConnectionClosed:
-                await self._on_message(message)
+                self._on_closed()
                 break
             if message is None:
                 self._on_closed()
                 break
-            await self._on_message(message)
+            try:
+                await self._on_message(message)
+            except Exception:
+                # One bad frame must not stop the reader, or every pending
+                # send() would wait forever.
+                continue
 
     def url(self):
         return self._url
 
+    def flatten(self):
+        return self._flatten
+
+    def codec(self):
+        return self._codec
+
     async def send(self, method, params={}):
         self._last_id += 1
         _id = self._last_id
-        message = json.dumps({
+        message = self._codec.dumps({
             'id': _id,
             'method': method,
             'params': params
         })
         # print('SEND ►', message)
-        await self._ws.send(message)
         future = asyncio.Future()
         self._callbacks[_id] = {
             'method': method,
             'resolve': future
         }
+        await self._ws.send(message)
         return await future
 
+    async def _send_raw(self, message):
+        await self._ws.send(message)
+
+    def _is_unobserved_event(self, message):
+        if not isinstance(message, str):
+            return False
+        match = EVENT_METHOD.match(message)
+        if not match:
+            return False
+        method = match.group(1)
+        if method == 'Target.receivedMessageFromTarget':
+            match = TARGET_MESSAGE.match(message)
+            if not match:
+                return False
+            session = self._sessions.get(match.group(1), None)
+            return not session or not session.listener_count(match.group(2))
+        match = FLAT_SESSION_ID.search(message[-128:])
+        if match:
+            session = self._sessions.get(match.group(1), None)
+            return not session or not session.listener_count(method)
+        if '"sessionId":' in message:
+            # The session id isn't at the tail, so it can't be told cheaply
+            # who is listening; decode the frame fully.
+            return False
+        if method in CONNECTION_EVENTS:
+            return False
+        return not self.listener_count(method)
+
     async def _on_message(self, message):
+        if self._is_unobserved_event(message):
+            return
         if self._delay:
             await asyncio.sleep(self._delay)
         # print('◀ RECV', message)
-        data = json.loads(message)
+        data = self._codec.loads(message)
+        if 'sessionId' in data:
+            session = self._sessions.get(data['sessionId'], None)
+            if session:
+                session._on_data(data)
+            return
         if 'id' in data and data['id'] and data['id'] in self._callbacks:
             callback = self._callbacks[data['id']]
             future = callback['resolve']
@@ -93,7 +163,7 @@ class Connection(EventEmitter):
                 session = self._sessions.get(data['params']['sessionId'], None)
                 if session:
                     session._on_closed()
-                del self._sessions[data['params']['sessionId']]
+                self._sessions.pop(data['params']['sessionId'], None)
             else:
                 # print('---------Emitting------------{}'.format(data['method']))
                 self.emit(data['method'], data['params'])
@@ -117,9 +187,10 @@ class Connection(EventEmitter):
         self._ws.close()
 
     async def create_session(self, target_id):
-        res = await self.send('Target.attachToTarget', {
-            'targetId': target_id
-        })
+        params = {'targetId': target_id}
+        if self._flatten:
+            params['flatten'] = True
+        res = await self.send('Target.attachToTarget', params)
         session_id = res['sessionId']
         session = Session(self, target_id, session_id)
         self._sessions[session_id] = session
@@ -128,17 +199,86 @@ class Connection(EventEmitter):
 
 class Session(EventEmitter):
 
+    # Domains that only stream events after `<Domain>.enable`. In lazy mode
+    # attaching a listener for one of their events enables the domain.
+    LazyDomains = ('Network', 'Page', 'Runtime', 'Security')
+
     def __init__(self, connection, target_id, session_id):
         super().__init__()
         self._last_id = 0
         self._callbacks = {}
         self._connection = connection
+        self._codec = connection.codec()
         self._target_id = target_id
         self._session_id = session_id
 
+        self._lazy_domains = False
+        self._domain_refs = {}
+        self._domain_futures = {}
+        self._domain_listeners = {}
+        self._required_domains = set()
+
     def target_id(self):
         return self._target_id
 
+    def is_closed(self):
+        return not self._connection
+
+    def set_lazy_domains(self, value):
+        self._lazy_domains = value
+
+    def on(self, event, callback):
+        super().on(event, callback)
+        domain = event.split('.')[0]
+        if self._lazy_domains and domain in Session.LazyDomains:
+            self._domain_listeners[event] = \
+                self._domain_listeners.get(event, 0) + 1
+            self.retain_domain(domain)
+
+    def remove_listener(self, event, cb):
+        count = self.listener_count(event)
+        super().remove_listener(event, cb)
+        counted = self._domain_listeners.get(event, 0)
+        removed = min(count - self.listener_count(event), counted)
+        if not removed:
+            return
+        if counted == removed:
+            del self._domain_listeners[event]
+        else:
+            self._domain_listeners[event] = counted - removed
+        for _ in range(removed):
+            self.release_domain(event.split('.')[0])
+
+    def retain_domain(self, domain):
+        refs = self._domain_refs.get(domain, 0)
+        self._domain_refs[domain] = refs + 1
+        if not refs:
+            self._toggle_domain(domain, True)
+        return self._domain_futures[domain]
+
+    def release_domain(self, domain):
+        refs = self._domain_refs.get(domain, 0)
+        if refs > 1:
+            self._domain_refs[domain] = refs - 1
+        elif refs == 1:
+            del self._domain_refs[domain]
+            self._toggle_domain(domain, False)
+
+    async def require_domain(self, domain):
+        if domain not in self._required_domains:
+            self._required_domains.add(domain)
+            self.retain_domain(domain)
+        await self._domain_futures[domain]
+
+    def _toggle_domain(self, domain, enabled):
+        method = '{}.{}'.format(domain, 'enable' if enabled else 'disable')
+        future = asyncio.ensure_future(self.send(method))
+        # Listener driven toggles are never awaited; fetch the exception
+        # so a closed session doesn't log an unretrieved task error.
+        future.add_done_callback(
+            lambda fut: fut.cancelled() or fut.exception())
+        self._domain_futures[domain] = future
+
     async def send(self, method, params={}):
         if not self._connection:
             future = asyncio.Future()
@@ -149,11 +289,15 @@ class Session(EventEmitter):
             return await future
         self._last_id += 1
         _id = self._last_id
-        message = json.dumps({
+        payload = {
             'id': _id,
             'method': method,
             'params': params
-        })
+        }
+        flatten = self._connection.flatten()
+        if flatten:
+            payload['sessionId'] = self._session_id
+        message = self._codec.dumps(payload)
         # print('Debug Session: SEND ► ', message)
         future = asyncio.Future()
         self._callbacks[_id] = {
@@ -161,10 +305,13 @@ class Session(EventEmitter):
             'resolve': future
         }
         try:
-            res = await self._connection.send('Target.sendMessageToTarget', {
-                'sessionId': self._session_id,
-                'message': message
-            })
+            if flatten:
+                await self._connection._send_raw(message)
+            else:
+                await self._connection.send('Target.sendMessageToTarget', {
+                    'sessionId': self._session_id,
+                    'message': message
+                })
         except Exception as e:
             if _id in self._callbacks:
                 callback = self._callbacks[_id]
@@ -175,7 +322,9 @@ class Session(EventEmitter):
 
     def _on_message(self, message):
         # print('Debug Session: ◀ RECV ', message)
-        data = json.loads(message)
+        self._on_data(self._codec.loads(message))
+
+    def _on_data(self, data):
         if 'id' in data and data['id'] in self._callbacks:
             # print('id {} in data'.format(data['id']))
             callback = self._callbacks[data['id']]
@@ -186,7 +335,7 @@ class Session(EventEmitter):
                     'Protocol error ({}): {} {}'.format(
                         callback['method'],
                         data['error']['message'],
-                        data['error']['data']
+                        data['error'].get('data', '')
                     )
                 ))
             else:
@@ -0,0 +1,252 @@
+import asyncio
+
+from pyppeteer.helper import Helper
+
+
+def convert_to_disjoint_ranges(nested_ranges):
+    # Block coverage nests ranges, the innermost one deciding whether an
+    # offset ran. A sweep over the sorted range boundaries flattens them in
+    # O(n log n), whatever the size of the script.
+    points = []
+    for nested in nested_ranges:
+        length = nested['endOffset'] - nested['startOffset']
+        # Ends sort before starts at the same offset; outer ranges open
+        # first and close last.
+        points.append((nested['startOffset'], 1, -length, nested['count']))
+        points.append((nested['endOffset'], 0, length, None))
+    points.sort(key=lambda point: point[:3])
+
+    counts = []
+    results = []
+    last_offset = 0
+    for offset, is_start, _, count in points:
+        if counts and last_offset < offset and counts[-1] > 0:
+            if results and results[-1]['end'] == last_offset:
+                results[-1]['end'] = offset
+            else:
+                results.append({'start': last_offset, 'end': offset})
+        last_offset = offset
+        if is_start:
+            counts.append(count)
+        else:
+            counts.pop()
+    return [
+        result for result in results if result['end'] - result['start'] > 1
+    ]
+
+
+def merge_ranges(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1]['end']:
+            merged[-1]['end'] = max(merged[-1]['end'], end)
+        else:
+            merged.append({'start': start, 'end': end})
+    return merged
+
+
+def used_bytes(ranges):
+    return sum(result['end'] - result['start'] for result in ranges)
+
+
+def summarize(entries):
+    # Collapses entries sharing a URL, e.g. the inline scripts of a page,
+    # into {url: {'usedBytes': ..., 'totalBytes': ...}}.
+    summary = {}
+    for entry in entries:
+        totals = summary.setdefault(
+            entry['url'], {'usedBytes': 0, 'totalBytes': 0})
+        totals['usedBytes'] += entry['usedBytes']
+        totals['totalBytes'] += entry['totalBytes']
+    return summary
+
+
+class JSCoverage(object):
+
+    def __init__(self, client):
+        self._client = client
+        self._enabled = False
+        self._script_urls = {}
+        self._listeners = []
+        self._reset_on_navigation = True
+        self._report_anonymous_scripts = False
+
+    def is_enabled(self):
+        return self._enabled
+
+    async def start(self, options={}):
+        assert not self._enabled, 'JSCoverage is already enabled'
+        self._reset_on_navigation = options['resetOnNavigation'] \
+            if 'resetOnNavigation' in options else True
+        self._report_anonymous_scripts = \
+            options['reportAnonymousScripts'] \
+            if 'reportAnonymousScripts' in options else False
+        self._enabled = True
+        self._script_urls = {}
+        self._listeners = [
+            Helper.add_event_listener(
+                self._client, 'Debugger.scriptParsed',
+                self._on_script_parsed),
+            Helper.add_event_listener(
+                self._client, 'Runtime.executionContextsCleared',
+                self._on_execution_contexts_cleared),
+        ]
+        await asyncio.gather(
+            self._client.send('Profiler.enable'),
+            self._client.send('Profiler.startPreciseCoverage', {
+                'callCount': False,
+                'detailed': True
+            }),
+            self._client.send('Debugger.enable'),
+            self._client.send('Debugger.setSkipAllPauses', {'skip': True})
+        )
+
+    async def stop(self):
+        assert self._enabled, 'JSCoverage is not enabled'
+        self._enabled = False
+        response = await self._client.send('Profiler.takePreciseCoverage')
+        await asyncio.gather(
+            self._client.send('Profiler.stopPreciseCoverage'),
+            self._client.send('Profiler.disable'),
+            self._client.send('Debugger.disable')
+        )
+        Helper.remove_event_listeners(self._listeners)
+        self._listeners = []
+
+        entries = []
+        for script in response['result']:
+            url = self._script_urls.get(script['scriptId'])
+            if url is None:
+                continue
+            nested_ranges = [
+                nested
+                for function in script['functions']
+                for nested in function['ranges']
+            ]
+            if not nested_ranges:
+                continue
+            ranges = convert_to_disjoint_ranges(nested_ranges)
+            entries.append({
+                'url': url,
+                'ranges': ranges,
+                'usedBytes': used_bytes(ranges),
+                # The top level function spans the whole script, so the
+                # source itself never has to be fetched.
+                'totalBytes': max(
+                    nested['endOffset'] for nested in nested_ranges),
+            })
+        self._script_urls = {}
+        return entries
+
+    def _on_execution_contexts_cleared(self, event):
+        if self._reset_on_navigation:
+            self._script_urls = {}
+
+    def _on_script_parsed(self, event):
+        url = event['url'] if 'url' in event else ''
+        if not url and not self._report_anonymous_scripts:
+            return
+        self._script_urls[event['scriptId']] = url or \
+            'debugger://VM{}'.format(event['scriptId'])
+
+
+class CSSCoverage(object):
+
+    def __init__(self, client):
+        self._client = client
+        self._enabled = False
+        self._stylesheets = {}
+        self._listeners = []
+        self._reset_on_navigation = True
+
+    def is_enabled(self):
+        return self._enabled
+
+    async def start(self, options={}):
+        assert not self._enabled, 'CSSCoverage is already enabled'
+        self._reset_on_navigation = options['resetOnNavigation'] \
+            if 'resetOnNavigation' in options else True
+        self._enabled = True
+        self._stylesheets = {}
+        self._listeners = [
+            Helper.add_event_listener(
+                self._client, 'CSS.styleSheetAdded',
+                self._on_stylesheet_added),
+            Helper.add_event_listener(
+                self._client, 'Runtime.executionContextsCleared',
+                self._on_execution_contexts_cleared),
+        ]
+        await self._client.send('DOM.enable')
+        await self._client.send('CSS.enable')
+        await self._client.send('CSS.startRuleUsageTracking')
+
+    async def stop(self):
+        assert self._enabled, 'CSSCoverage is not enabled'
+        self._enabled = False
+        response = await self._client.send('CSS.stopRuleUsageTracking')
+        await asyncio.gather(
+            self._client.send('CSS.disable'),
+            self._client.send('DOM.disable')
+        )
+        Helper.remove_event_listeners(self._listeners)
+        self._listeners = []
+
+        used = {}
+        for rule in response['ruleUsage']:
+            if rule['used']:
+                used.setdefault(rule['styleSheetId'], []).append(
+                    (rule['startOffset'], rule['endOffset']))
+        entries = []
+        for stylesheet_id, header in self._stylesheets.items():
+            ranges = merge_ranges(used.get(stylesheet_id, ()))
+            entries.append({
+                'url': header['url'],
+                'ranges': ranges,
+                'usedBytes': used_bytes(ranges),
+                'totalBytes': header['length'],
+            })
+        self._stylesheets = {}
+        return entries
+
+    def _on_execution_contexts_cleared(self, event):
+        if self._reset_on_navigation:
+            self._stylesheets = {}
+
+    def _on_stylesheet_added(self, event):
+        header = event['header']
+        url = header['sourceURL'] if 'sourceURL' in header else ''
+        # Inline and constructed stylesheets without a URL are skipped, like
+        # anonymous scripts are.
+        if not url:
+            return
+        self._stylesheets[header['styleSheetId']] = {
+            'url': url,
+            'length': header['length'] if 'length' in header else 0,
+        }
+
+
+class Coverage(object):
+
+    def __init__(self, client):
+        self._js = JSCoverage(client)
+        self._css = CSSCoverage(client)
+
+    async def start_js_coverage(self, options={}):
+        return await self._js.start(options)
+
+    async def stop_js_coverage(self):
+        return await self._js.stop()
+
+    async def start_css_coverage(self, options={}):
+        return await self._css.start(options)
+
+    async def stop_css_coverage(self):
+        return await self._css.stop()
+
+    async def _reset(self):
+        # Turns off whatever a previous user of a pooled page left running,
+        # dropping its results.
+        if self._js.is_enabled():
+            await self._js.stop()
+        if self._css.is_enabled():
+            await self._css.stop()
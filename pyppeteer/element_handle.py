@@ -1,47 +1,45 @@
 import json
 
 from pyppeteer.helper import Helper
+from pyppeteer.js_handle import JSHandle
 
 
-class ElementHandle(object):
+class ElementHandle(JSHandle):
 
-    def __init__(self, client, remote_object, mouse):
-        self._client = client
-        self._remote_object = remote_object
+    def __init__(self, frame, client, remote_object, mouse, scope=None):
+        super().__init__(frame, client, remote_object, scope)
         self._mouse = mouse
-        self._disposed = False
 
-    async def dispose(self):
-        if self._disposed:
-            return
-        self._disposed = True
-        await Helper.release_object(self._client, self._remote_object)
+    def as_element(self):
+        return self
 
     async def evaluate(self, page_function, *args):
         assert not self._disposed
-        assert isinstance(page_function, (str, unicode))
+        assert Helper.is_string(page_function)
 
         stringified_args = ['this']
         stringified_args.extend([json.dumps(x) for x in args])
         func_declaration = (
-            'function() { return ({})'
-            '({}) }').format(page_function, ','.join(stringified_args))
+            'function() {{ return ({})'
+            '({}) }}').format(page_function, ','.join(stringified_args))
         object_id = self._remote_object['objectId']
-        res = await self._client.send(
-            'Runtime.callFunctionOn', {
-                'objectId': object_id,
-                'functionDeclaration': func_declaration,
-                'returnByValue': False,
-                'awaitPromise': True
-            }
-        )
-        if 'exceptionDetails' in res:
-            exception_details = res['exceptionDetails']
-        else:
-            exception_details = None
-        if exception_details:
-            # print(exception_details)
-            raise Exception('Evaluation failed: ')
+        try:
+            res = await self._client.send(
+                'Runtime.callFunctionOn', {
+                    'objectId': object_id,
+                    'functionDeclaration': func_declaration,
+                    'returnByValue': True,
+                    'awaitPromise': True
+                }
+            )
+        except Exception as e:
+            if not Helper.is_by_value_error(e):
+                raise
+            raise Exception(
+                'Evaluation failed: result is not serializable: {}'.format(e))
+        if 'exceptionDetails' in res and res['exceptionDetails']:
+            raise Exception('Evaluation failed: {}'.format(
+                Helper.get_exception_message(res['exceptionDetails'])))
         return await Helper.serialize_remote_object(
             self._client, res['result'])
 
@@ -19,6 +19,9 @@ class EventEmitter(object):
                 arguments.append(**kwargs)
             res = callback(*arguments)
 
+    def listener_count(self, event):
+        return len(self._events.get(event, ()))
+
     def remove_listener(self, event, cb):
         if event in self._events:
             self._events[event] = [
@@ -1,6 +1,11 @@
+import asyncio
+import json
+
 from pyppeteer.helper import Helper
 from pyppeteer.element_handle import ElementHandle
 from pyppeteer.emitter import EventEmitter
+from pyppeteer.js_handle import JSHandle, HandleScope
+from pyppeteer.script_cache import ScriptCache
 
 
 wait_for_predicate_page_func = '''
@@ -128,9 +133,16 @@ class WaitTask(object):
 
 class Frame(object):
 
-    def __init__(self, client, mouse, parent_frame, frame_id):
+    def __init__(
+            self, client, mouse, parent_frame, frame_id, script_cache=None,
+            handle_contexts=None):
         self._client = client
         self._mouse = mouse
+        self._script_cache = script_cache
+        # Ids of contexts holding handles in their object group, shared with
+        # the FrameManager that releases the group.
+        self._handle_contexts = handle_contexts \
+            if handle_contexts is not None else set()
         self._parent_frame = parent_frame
         self._url = ''
         self._id = frame_id
@@ -142,32 +154,194 @@ class Frame(object):
             self._parent_frame._child_frames.add(self)
 
     async def evaluate(self, page_function, *args):
-        remote_object = await self._raw_evaluate(page_function, *args)
+        # Plain data comes back in the evaluate response itself; only S()
+        # and friends need a remote handle.
+        try:
+            remote_object = await self._raw_evaluate(
+                page_function, *args, return_by_value=True)
+        except Exception as e:
+            if not Helper.is_by_value_error(e):
+                raise
+            # The function already ran, so don't run it again for a handle;
+            # fail the same way JSHandle.json_value does.
+            raise Exception(
+                'Evaluation failed: result is not serializable: {}'.format(e))
         return await Helper.serialize_remote_object(
             self._client, remote_object)
 
+    async def evaluate_handle(self, page_function, *args):
+        return await self._evaluate_handle(page_function, args, None)
+
+    def handle_scope(self):
+        return HandleScope(self, self._client)
+
+    async def evaluate_many(self, items):
+        # Items are page functions or expressions, or (page_function, *args)
+        # tuples. They all run in one Runtime.evaluate and come back by
+        # value; a failed item yields an Exception in its place, like
+        # asyncio.gather(..., return_exceptions=True).
+        functions = []
+        arguments = []
+        for item in items:
+            if Helper.is_string(item):
+                page_function, args = item, ()
+            else:
+                page_function, args = item[0], tuple(item[1:])
+            if not Helper.is_function_string(page_function):
+                assert not args, 'Cannot evaluate a string with arguments'
+                page_function = '() => ({})'.format(page_function)
+            functions.append(page_function)
+            arguments.append(list(args))
+        if not functions:
+            return []
+        expression = '''(async (sources, args) => {{
+            const settle = async (source, index) => {{
+                try {{
+                    // Compiled one by one, so a syntax error only fails
+                    // its own item.
+                    const fn = (0, eval)('(' + source + ')');
+                    const value = await fn(...args[index]);
+                    if (typeof value === 'number' &&
+                            (!isFinite(value) || Object.is(value, -0)))
+                        return {{unserializable: Object.is(value, -0) ?
+                            '-0' : String(value)}};
+                    // Round trip here, so a value that can't be returned
+                    // by value fails its own slot, not the whole batch.
+                    const json = JSON.stringify(value);
+                    return json === undefined ? {{}} :
+                        {{value: JSON.parse(json)}};
+                }} catch (error) {{
+                    return {{error: error && error.stack ?
+                        error.stack : String(error)}};
+                }}
+            }};
+            return Promise.all(sources.map(settle));
+        }})({}, {})'''.format(json.dumps(functions), json.dumps(arguments))
+        await self._client.require_domain('Runtime')
+        res = await self._client.send('Runtime.evaluate', {
+            'expression': expression,
+            'contextId': self._default_context_id,
+            'returnByValue': True,
+            'awaitPromise': True
+        })
+        if 'exceptionDetails' in res and res['exceptionDetails']:
+            raise Exception('Evaluation failed: {}'.format(
+                Helper.get_exception_message(res['exceptionDetails'])))
+        results = []
+        for settled in res['result']['value']:
+            if 'error' in settled:
+                results.append(Exception(
+                    'Evaluation failed: {}'.format(settled['error'])))
+            elif 'unserializable' in settled:
+                results.append(
+                    Helper.unserializable_value(settled['unserializable']))
+            else:
+                results.append(settled.get('value'))
+        return results
+
     async def S(self, selector):
-        remote_object = await self._raw_evaluate('''
-            ({}) => document.querySelector({})
-        '''.format(selector, selector), selector)
+        return await self._query_selector(selector, None)
+
+    async def SS(self, selector):
+        return await self._query_selector_all(selector, None)
+
+    async def SS_eval(self, selector, page_function, *args):
+        # Maps page_function(element, *args) over every match inside the
+        # page and returns the results by value, in one round trip.
+        assert Helper.is_function_string(page_function), \
+            'SS_eval expects a function'
+        mapper = '''(selector, ...args) => Promise.all(
+            Array.from(document.querySelectorAll(selector),
+                element => ({})(element, ...args)))'''.format(page_function)
+        return await self.evaluate(mapper, selector, *args)
+
+    async def _query_selector(self, selector, scope):
+        remote_object = await self._raw_evaluate(
+            '(selector) => document.querySelector(selector)', selector,
+            object_group=self._object_group(scope))
         if 'subtype' in remote_object and remote_object['subtype'] == 'node':
-            return ElementHandle(self._client, remote_object, self._mouse)
-        Helper.release_object(self._client, remote_object)
+            return self._create_handle(remote_object, scope)
+        await Helper.release_object(self._client, remote_object)
         return None
 
-    async def _raw_evaluate(self, page_function, *args):
-        expression = Helper.evaluation_string(page_function, *args)
+    async def _query_selector_all(self, selector, scope):
+        # One evaluate for the array of matches and one getProperties for
+        # its items, however many elements match.
+        remote_object = await self._raw_evaluate(
+            '(selector) => Array.from(document.querySelectorAll(selector))',
+            selector,
+            object_group=self._object_group(scope))
+        try:
+            res = await self._client.send('Runtime.getProperties', {
+                'objectId': remote_object['objectId'],
+                'ownProperties': True
+            })
+        finally:
+            # Not awaited, which keeps the query at two round trips.
+            asyncio.ensure_future(
+                Helper.release_object(self._client, remote_object))
+        elements = []
+        for prop in res['result']:
+            if not prop['name'].isdigit() or 'value' not in prop:
+                continue
+            value = prop['value']
+            if 'subtype' in value and value['subtype'] == 'node':
+                elements.append((int(prop['name']), value))
+        elements.sort(key=lambda element: element[0])
+        return [
+            self._create_handle(value, scope) for _, value in elements
+        ]
+
+    def _object_group(self, scope):
+        if scope:
+            return scope.object_group()
         context_id = self._default_context_id
-        res = await self._client.send('Runtime.evaluate', {
-            'expression': expression,
-            'contextId': context_id,
-            'returnByValue': False,
-            'awaitPromise': True
-        })
+        self._handle_contexts.add(context_id)
+        return Frame.context_object_group(context_id)
+
+    @staticmethod
+    def context_object_group(context_id):
+        return 'pyppeteer-context-{}'.format(context_id)
+
+    def _create_handle(self, remote_object, scope=None):
+        if 'subtype' in remote_object and remote_object['subtype'] == 'node':
+            return ElementHandle(
+                self, self._client, remote_object, self._mouse, scope)
+        return JSHandle(self, self._client, remote_object, scope)
+
+    async def _evaluate_handle(self, page_function, args, scope):
+        remote_object = await self._raw_evaluate(
+            page_function, *args,
+            object_group=self._object_group(scope))
+        return self._create_handle(remote_object, scope)
+
+    async def _raw_evaluate(
+            self, page_function, *args, return_by_value=False,
+            object_group=None):
+        await self._client.require_domain('Runtime')
+        context_id = self._default_context_id
+        res = None
+        if self._script_cache and \
+                Helper.is_function_string(page_function) and \
+                self._script_cache.is_hot(page_function):
+            res = await self._script_cache.call(
+                context_id, page_function, args, return_by_value,
+                object_group)
+        if res is None:
+            expression = Helper.evaluation_string(page_function, *args)
+            params = {
+                'expression': expression,
+                'contextId': context_id,
+                'returnByValue': return_by_value,
+                'awaitPromise': True
+            }
+            if object_group:
+                params['objectGroup'] = object_group
+            res = await self._client.send('Runtime.evaluate', params)
         if 'exceptionDetails' in res and res['exceptionDetails']:
-            # print(res['exceptionDetails'])
-            raise Exception('Evaluation failed: ')
-        return remote_object
+            raise Exception('Evaluation failed: {}'.format(
+                Helper.get_exception_message(res['exceptionDetails'])))
+        return res['result']
 
     def name(self):
         return self._name or ''
@@ -210,7 +384,7 @@ class Frame(object):
         raise NotImplementedError
 
     async def title(self):
-        return self.evaluate('() => document.title')
+        return await self.evaluate('() => document.title')
 
     def _navigated(self, frame_payload):
         self._name = frame_payload['name'] if 'name' in frame_payload else ''
@@ -243,6 +417,8 @@ class FrameManager(EventEmitter):
 
         self._frames = {}
         self._main_frame = None
+        self._script_cache = ScriptCache(client)
+        self._handle_contexts = set()
 
         self._client.on(
             'Page.frameAttached',
@@ -261,6 +437,13 @@ class FrameManager(EventEmitter):
             'Runtime.executionContextCreated',
             lambda event: self._on_execution_context_created(
                 event['context']))
+        self._client.on(
+            'Runtime.executionContextDestroyed',
+            lambda event: self._on_execution_context_destroyed(
+                event['executionContextId']))
+        self._client.on(
+            'Runtime.executionContextsCleared',
+            lambda event: self._on_execution_contexts_cleared())
 
     def main_frame(self):
         return self._main_frame
@@ -273,7 +456,9 @@ class FrameManager(EventEmitter):
             return
         assert parent_frame_id
         parent_frame = self._frames[parent_frame_id]
-        frame = Frame(self._client, self._mouse, parent_frame, frame_id)
+        frame = Frame(
+            self._client, self._mouse, parent_frame, frame_id,
+            self._script_cache, self._handle_contexts)
         self._frames[frame._id] = frame
         self.emit(FrameManager.Events['FrameAttached'], frame)
 
@@ -282,7 +467,9 @@ class FrameManager(EventEmitter):
             return
         assert parent_frame_id
         parent_frame = self._frames.get(parent_frame_id)
-        frame = Frame(self._client, self._mouse, parent_frame, frame_id)
+        frame = Frame(
+            self._client, self._mouse, parent_frame, frame_id,
+            self._script_cache, self._handle_contexts)
         self._frames[frame._id] = frame
         self.emit(FrameManager.Events['FrameAttached'], frame)
 
@@ -303,7 +490,8 @@ class FrameManager(EventEmitter):
                 frame._id = frame_payload['id']
             else:
                 frame = Frame(
-                    self._client, self._mouse, None, frame_payload['id'])
+                    self._client, self._mouse, None, frame_payload['id'],
+                    self._script_cache, self._handle_contexts)
             self._frames[frame_payload['id']] = frame
             self._main_frame = frame
 
@@ -322,10 +510,31 @@ class FrameManager(EventEmitter):
         frame = self._frames.get(frame_id, None)
         if not frame:
             return
+        self._script_cache.invalidate(frame._default_context_id)
         frame._default_context_id = context['id']
         for wait_task in frame._wait_tasks:
             wait_task.rerun()
 
+    def _on_execution_context_destroyed(self, context_id):
+        self._script_cache.invalidate(context_id)
+        self._release_context_handles(context_id)
+
+    def _on_execution_contexts_cleared(self):
+        self._script_cache.clear()
+        for context_id in list(self._handle_contexts):
+            self._release_context_handles(context_id)
+
+    def _release_context_handles(self, context_id):
+        if context_id not in self._handle_contexts:
+            return
+        self._handle_contexts.discard(context_id)
+        future = asyncio.ensure_future(self._client.send(
+            'Runtime.releaseObjectGroup', {
+                'objectGroup': Frame.context_object_group(context_id)
+            }))
+        future.add_done_callback(
+            lambda fut: fut.cancelled() or fut.exception())
+
     def _remove_frames_recursively(self, frame):
         for child in frame.child_frames():
             self._remove_frames_recursively(child)
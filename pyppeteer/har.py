@@ -0,0 +1,286 @@
+import datetime
+import json
+import urllib.parse as urlparse
+
+from pyppeteer.helper import Helper
+
+HAR_VERSION = '1.2'
+
+
+def iso_time(wall_time):
+    return datetime.datetime.fromtimestamp(
+        wall_time, datetime.timezone.utc).isoformat()
+
+
+def har_headers(headers):
+    result = []
+    for name, value in headers.items():
+        # Chrome joins repeated headers with newlines.
+        for line in str(value).split('\n'):
+            result.append({'name': name, 'value': line})
+    return result
+
+
+def http_version(protocol):
+    if not protocol:
+        return ''
+    if protocol == 'h2':
+        return 'HTTP/2.0'
+    return protocol.upper()
+
+
+class HARRecorder(object):
+
+    def __init__(self, client):
+        self._client = client
+        self._file = None
+        self._listeners = []
+        # Only requests still in flight are kept; finished entries are
+        # written out straight away.
+        self._requests = {}
+        self._pages = []
+        self._main_frame_id = None
+        self._entry_count = 0
+
+    def is_recording(self):
+        return self._file is not None
+
+    async def start(self, options={}):
+        assert not self._file, 'HAR recording is already started'
+        assert 'path' in options, 'HAR path is required'
+        # Held only while recording; stop() gives them back.
+        await self._client.retain_domain('Network')
+        await self._client.retain_domain('Page')
+        self._file = open(options['path'], 'w')
+        self._requests = {}
+        self._pages = []
+        self._main_frame_id = None
+        self._entry_count = 0
+        self._file.write('{{"log": {{"version": {}, "creator": {}, '
+                         '"entries": ['.format(
+                             json.dumps(HAR_VERSION),
+                             json.dumps({'name': 'pyppeteer', 'version': ''})))
+        self._listeners = [
+            Helper.add_event_listener(
+                self._client, 'Network.requestWillBeSent',
+                self._on_request_will_be_sent),
+            Helper.add_event_listener(
+                self._client, 'Network.responseReceived',
+                self._on_response_received),
+            Helper.add_event_listener(
+                self._client, 'Network.dataReceived',
+                self._on_data_received),
+            Helper.add_event_listener(
+                self._client, 'Network.loadingFinished',
+                self._on_loading_finished),
+            Helper.add_event_listener(
+                self._client, 'Network.loadingFailed',
+                self._on_loading_failed),
+            Helper.add_event_listener(
+                self._client, 'Page.frameNavigated',
+                self._on_frame_navigated),
+            Helper.add_event_listener(
+                self._client, 'Page.domContentEventFired',
+                self._on_dom_content_event_fired),
+            Helper.add_event_listener(
+                self._client, 'Page.loadEventFired',
+                self._on_load_event_fired),
+        ]
+
+    async def stop(self):
+        assert self._file, 'HAR recording is not started'
+        Helper.remove_event_listeners(self._listeners)
+        self._listeners = []
+        # Whatever is still loading goes in as it stands.
+        for request in list(self._requests.values()):
+            self._write_entry(request, None)
+        self._requests = {}
+        pages = [{
+            'startedDateTime': iso_time(page['wallTime']),
+            'id': page['id'],
+            'title': page['title'],
+            'pageTimings': page['pageTimings'],
+        } for page in self._pages]
+        self._file.write('], "pages": {}}}}}'.format(json.dumps(pages)))
+        self._file.close()
+        self._file = None
+        self._client.release_domain('Network')
+        self._client.release_domain('Page')
+        return self._entry_count
+
+    def _current_page(self):
+        return self._pages[-1] if self._pages else None
+
+    def _on_frame_navigated(self, event):
+        if 'parentId' in event['frame']:
+            return
+        self._main_frame_id = event['frame']['id']
+        page = self._current_page()
+        if page:
+            page['title'] = event['frame']['url']
+
+    def _is_navigation(self, event):
+        # A main frame document request starts a new page; for those Chrome
+        # uses the loader id as the request id.
+        if event.get('type') != 'Document' or 'redirectResponse' in event:
+            return False
+        if event['requestId'] != event.get('loaderId'):
+            return False
+        return self._main_frame_id is None or \
+            event.get('frameId') == self._main_frame_id
+
+    def _page_timing(self, name, event):
+        page = self._current_page()
+        if page:
+            page['pageTimings'][name] = \
+                (event['timestamp'] - page['timestamp']) * 1000
+
+    def _on_dom_content_event_fired(self, event):
+        self._page_timing('onContentLoad', event)
+
+    def _on_load_event_fired(self, event):
+        self._page_timing('onLoad', event)
+
+    def _on_request_will_be_sent(self, event):
+        previous = self._requests.get(event['requestId'])
+        if previous and 'redirectResponse' in event:
+            previous['response'] = event['redirectResponse']
+            previous['redirectURL'] = event['request']['url']
+            self._write_entry(previous, event['timestamp'])
+        if self._is_navigation(event):
+            self._pages.append({
+                'id': 'page_{}'.format(len(self._pages) + 1),
+                'title': event['request']['url'],
+                'wallTime': event['wallTime'],
+                'timestamp': event['timestamp'],
+                'pageTimings': {'onContentLoad': -1, 'onLoad': -1},
+            })
+        page = self._current_page()
+        self._requests[event['requestId']] = {
+            'request': event['request'],
+            'wallTime': event['wallTime'],
+            'timestamp': event['timestamp'],
+            'pageref': page['id'] if page else None,
+            'response': None,
+            'redirectURL': '',
+            'dataLength': 0,
+            'encodedDataLength': -1,
+        }
+
+    def _on_response_received(self, event):
+        request = self._requests.get(event['requestId'])
+        if request:
+            request['response'] = event['response']
+
+    def _on_data_received(self, event):
+        request = self._requests.get(event['requestId'])
+        if request:
+            request['dataLength'] += event['dataLength']
+
+    def _on_loading_finished(self, event):
+        request = self._requests.pop(event['requestId'], None)
+        if request:
+            request['encodedDataLength'] = event['encodedDataLength']
+            self._write_entry(request, event['timestamp'])
+
+    def _on_loading_failed(self, event):
+        request = self._requests.pop(event['requestId'], None)
+        if request:
+            request['errorText'] = event['errorText']
+            self._write_entry(request, event['timestamp'])
+
+    def _write_entry(self, request, finished):
+        entry = self._entry(request, finished)
+        if self._entry_count:
+            self._file.write(', ')
+        self._file.write(json.dumps(entry))
+        self._entry_count += 1
+
+    def _entry(self, request, finished):
+        payload = request['request']
+        response = request['response'] or {}
+        timings = self._timings(request, response, finished)
+        query = urlparse.parse_qsl(
+            urlparse.urlparse(payload['url']).query, keep_blank_values=True)
+        har_request = {
+            'method': payload['method'],
+            'url': payload['url'],
+            'httpVersion': http_version(response.get('protocol')),
+            'cookies': [],
+            'headers': har_headers(payload['headers']),
+            'queryString': [
+                {'name': name, 'value': value} for name, value in query
+            ],
+            'headersSize': -1,
+            'bodySize': len(payload.get('postData', '')),
+        }
+        if 'postData' in payload:
+            har_request['postData'] = {
+                'mimeType': payload['headers'].get('Content-Type', ''),
+                'text': payload['postData'],
+            }
+        entry = {
+            'startedDateTime': iso_time(request['wallTime']),
+            'time': sum(
+                value for name, value in timings.items()
+                if name != 'ssl' and value > 0),
+            'request': har_request,
+            'response': {
+                'status': response.get('status', 0),
+                'statusText': response.get('statusText', ''),
+                'httpVersion': http_version(response.get('protocol')),
+                'cookies': [],
+                'headers': har_headers(response.get('headers', {})),
+                'content': {
+                    'size': request['dataLength'],
+                    'mimeType': response.get('mimeType', 'x-unknown'),
+                },
+                'redirectURL': request['redirectURL'],
+                'headersSize': -1,
+                'bodySize': request['encodedDataLength'],
+                '_transferSize': request['encodedDataLength'],
+            },
+            'cache': {},
+            'timings': timings,
+        }
+        if request['pageref']:
+            entry['pageref'] = request['pageref']
+        if 'remoteIPAddress' in response:
+            entry['serverIPAddress'] = response['remoteIPAddress']
+        if 'connectionId' in response:
+            entry['connection'] = str(response['connectionId'])
+        if 'errorText' in request:
+            entry['response']['_error'] = request['errorText']
+        return entry
+
+    def _timings(self, request, response, finished):
+        timing = response.get('timing')
+        if not timing:
+            total = (finished - request['timestamp']) * 1000 \
+                if finished is not None else -1
+            return {
+                'blocked': -1, 'dns': -1, 'connect': -1, 'ssl': -1,
+                'send': 0, 'wait': max(total, 0), 'receive': 0,
+            }
+        # Offsets in the timing object are milliseconds since requestTime.
+        blocked = 0
+        for start in ('dnsStart', 'connectStart', 'sendStart'):
+            if timing[start] >= 0:
+                blocked = timing[start]
+                break
+        dns = timing['dnsEnd'] - timing['dnsStart'] \
+            if timing['dnsStart'] >= 0 else -1
+        connect = timing['connectEnd'] - timing['connectStart'] \
+            if timing['connectStart'] >= 0 else -1
+        ssl = timing['sslEnd'] - timing['sslStart'] \
+            if timing['sslStart'] >= 0 else -1
+        send = timing['sendEnd'] - timing['sendStart']
+        wait = timing['receiveHeadersEnd'] - timing['sendEnd']
+        receive = 0
+        if finished is not None:
+            receive = max((finished - timing['requestTime']) * 1000 -
+                          timing['receiveHeadersEnd'], 0)
+        return {
+            'blocked': blocked, 'dns': dns, 'connect': connect,
+            'send': send, 'wait': wait, 'receive': receive, 'ssl': ssl,
+        }
@@ -1,14 +1,27 @@
 import json
 import math
+import re
 
 _api_coverage = None
 
+# Matches the start of function source: `function`, `async function`,
+# `x =>`, `(a, b) =>` and their async forms.
+FUNCTION_SOURCE = re.compile(
+    r'^\s*(?:async\s+)?(?:function\b|(?:\([^()]*\)|[\w$]+)\s*=>)')
+
+# Protocol errors for a result that exists but can't be serialized, e.g.
+# window or a cyclic object.
+BY_VALUE_ERRORS = (
+    'Object couldn\'t be returned by value',
+    'Object reference chain is too long',
+)
+
 
 class Helper(object):
 
     @staticmethod
     def evaluation_string(fun, *args):
-        if Helper.is_string(fun):
+        if not Helper.is_function_string(fun):
             try:
                 assert len(args) == 0
                 return fun
@@ -21,27 +34,54 @@ class Helper(object):
         )
 
     @staticmethod
-    def get_exception_message(exception):
-        return exception.message
+    def is_function_string(fun):
+        return bool(FUNCTION_SOURCE.match(fun))
+
+    @staticmethod
+    def is_by_value_error(error):
+        message = str(error)
+        return any(reason in message for reason in BY_VALUE_ERRORS)
+
+    @staticmethod
+    def get_exception_message(exception_details):
+        if 'exception' in exception_details:
+            exception = exception_details['exception']
+            if 'description' in exception:
+                return exception['description']
+            if 'value' in exception:
+                return str(exception['value'])
+        message = exception_details['text']
+        if 'stackTrace' in exception_details:
+            for callframe in exception_details['stackTrace']['callFrames']:
+                message += '\n    at {}:{}:{}'.format(
+                    callframe['url'],
+                    callframe['lineNumber'],
+                    callframe['columnNumber'])
+        return message
+
+    @staticmethod
+    def unserializable_value(value):
+        if value == '-0':
+            return -0.0
+        elif value == 'NaN':
+            return math.nan
+        elif value == 'Infinity':
+            return math.inf
+        elif value == '-Infinity':
+            return -math.inf
+        raise Exception('Unsupported unserializable value: {}'.format(value))
 
     @staticmethod
     async def serialize_remote_object(client, remote_object):
         if 'unserializableValue' in remote_object:
-            val = remote_object['unserializableValue']
-            if val == '-0':
-                return -0
-            elif val == 'NaN':
-                return math.nan
-            elif val == 'Infinity':
-                return math.inf
-            elif val == '-Infinity':
-                return -math.inf
-            else:
-                raise Exception(
-                    'Unsupported unserializable value: {}'.format(val))
+            return Helper.unserializable_value(
+                remote_object['unserializableValue'])
         if 'objectId' not in remote_object or not remote_object['objectId']:
-            return remote_object['value']
-        if remote_object['subtype'] == 'promise':
+            # By-value results; undefined comes back without a value.
+            return remote_object['value'] if 'value' in remote_object \
+                else None
+        if 'subtype' in remote_object and \
+                remote_object['subtype'] == 'promise':
             return remote_object['description']
         try:
             response = await client.send('Runtime.callFunctionOn', {
@@ -53,7 +93,7 @@ class Helper(object):
         except Exception as e:
             return remote_object['description']
         finally:
-            Helper.release_object(client, remote_object)
+            await Helper.release_object(client, remote_object)
 
     @staticmethod
     async def release_object(client, remote_object):
@@ -104,8 +144,8 @@ class Helper(object):
 
     @staticmethod
     def is_string(var):
-        return isinstance(var, (str, unicode))
+        return isinstance(var, str)
 
     @staticmethod
     def is_number(var):
-        return isinstance(var, (int, long, float, complex))
+        return isinstance(var, (int, float, complex))
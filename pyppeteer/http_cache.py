@@ -0,0 +1,314 @@
+import asyncio
+import base64
+import collections
+import email.utils
+import hashlib
+import http.client
+import json
+import os
+import time
+
+from pyppeteer.loop import loop as asyncio_loop
+
+# Recomputed or meaningless once the body has been decoded by Chrome, or
+# not something a cached copy should replay.
+SKIPPED_HEADERS = frozenset((
+    'content-encoding',
+    'content-length',
+    'transfer-encoding',
+    'connection',
+    'keep-alive',
+    'set-cookie',
+))
+
+
+def parse_cache_control(value):
+    directives = {}
+    for directive in (value or '').split(','):
+        name, _, argument = directive.strip().partition('=')
+        if name:
+            directives[name.lower()] = argument.strip('"')
+    return directives
+
+
+def get_header(headers, name):
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def is_replayable_vary(value):
+    # Entries are keyed on method and URL alone, so only responses that
+    # vary on nothing but Accept-Encoding, which Chrome has already
+    # undone, are safe to replay for another request.
+    for name in (value or '').split(','):
+        name = name.strip().lower()
+        if name and name != 'accept-encoding':
+            return False
+    return True
+
+
+def remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def parse_http_date(value):
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+class HTTPCache(object):
+
+    # Options:
+    #   'maxSize': bytes kept on disk before least recently used entries go
+    #   'maxEntrySize': larger responses are never stored
+    #   'maxTTL': cap on how long any entry stays fresh, in seconds
+    #   'defaultTTL': freshness for responses that give no hint of their own
+    def __init__(self, path, options={}, loop=asyncio_loop):
+        self._path = path
+        self._loop = loop
+        self._max_size = options['maxSize'] \
+            if 'maxSize' in options else 256 * 1024 * 1024
+        self._max_entry_size = options['maxEntrySize'] \
+            if 'maxEntrySize' in options else 10 * 1024 * 1024
+        self._max_ttl = options['maxTTL'] if 'maxTTL' in options else None
+        self._default_ttl = options['defaultTTL'] \
+            if 'defaultTTL' in options else 0
+
+        # digest -> entry, least recently used first.
+        self._index = collections.OrderedDict()
+        self._size = 0
+        self._flush_handle = None
+        self._flush_lock = asyncio.Lock()
+        self._hits = 0
+        self._misses = 0
+
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    @staticmethod
+    def key(method, url, post_data=None):
+        return hashlib.sha1(
+            json.dumps([method, url, post_data]).encode('utf-8')
+        ).hexdigest()
+
+    def size(self):
+        return self._size
+
+    def stats(self):
+        return {
+            'entries': len(self._index),
+            'size': self._size,
+            'hits': self._hits,
+            'misses': self._misses,
+        }
+
+    def lookup(self, payload):
+        # Returns the digest of a fresh entry for the request, or None on a
+        # miss. Only the in-memory index is consulted, so this is safe to
+        # call from an event handler.
+        if payload['method'] != 'GET':
+            return None
+        request_cc = parse_cache_control(
+            get_header(payload['headers'], 'cache-control'))
+        if 'no-cache' in request_cc or 'no-store' in request_cc:
+            return None
+        digest = HTTPCache.key('GET', payload['url'], payload.get('postData'))
+        entry = self._index.get(digest)
+        if not entry:
+            self._misses += 1
+            return None
+        if entry['expires'] <= time.time():
+            self._remove(digest)
+            self._schedule_flush()
+            self._misses += 1
+            return None
+        self._index.move_to_end(digest)
+        self._hits += 1
+        return digest
+
+    async def raw_response(self, digest):
+        # Returns the entry as Network.continueInterceptedRequest expects it
+        # in rawResponse, or None if it is gone. The body is read off the
+        # event loop.
+        entry = self._index.get(digest)
+        if not entry:
+            return None
+        try:
+            body = await self._loop.run_in_executor(
+                None, self._read_body, digest)
+        except OSError:
+            self._remove(digest)
+            self._schedule_flush()
+            return None
+        lines = ['HTTP/1.1 {} {}'.format(
+            entry['status'], http.client.responses.get(entry['status'], ''))]
+        for name, value in entry['headers'].items():
+            # Chrome joins repeated headers with newlines.
+            for line in value.split('\n'):
+                lines.append('{}: {}'.format(name, line))
+        lines.append('Content-Length: {}'.format(len(body)))
+        head = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1', 'replace')
+        return base64.b64encode(head + body).decode('ascii')
+
+    async def store(self, response):
+        request = response.request()
+        if request.method != 'GET' or response.status != 200:
+            return False
+        ttl = self._freshness(response.headers)
+        if not ttl:
+            return False
+        digest = HTTPCache.key('GET', request.url, request.post_data)
+        entry = self._index.get(digest)
+        if entry and entry['expires'] > time.time():
+            # Most likely the copy we just served.
+            return False
+        try:
+            body = await response.buffer()
+        except Exception:
+            return False
+        if len(body) > self._max_entry_size:
+            return False
+        self._remove(digest)
+        try:
+            await self._loop.run_in_executor(
+                None, self._write_body, digest, body)
+        except OSError:
+            return False
+        # Another store of the same URL may have finished meanwhile; its
+        # file was just overwritten, so only its entry goes.
+        previous = self._index.pop(digest, None)
+        if previous:
+            self._size -= previous['size']
+        self._index[digest] = {
+            'url': request.url,
+            'status': response.status,
+            'headers': {
+                name: value for name, value in response.headers.items()
+                if name.lower() not in SKIPPED_HEADERS
+            },
+            'size': len(body),
+            'expires': time.time() + ttl,
+        }
+        self._size += len(body)
+        self._evict()
+        self._schedule_flush()
+        return True
+
+    async def clear(self):
+        paths = [self._body_path(digest) for digest in self._index]
+        self._index.clear()
+        self._size = 0
+        await self._loop.run_in_executor(None, remove_files, paths)
+        await self.flush()
+
+    async def flush(self):
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        entries = list(self._index.items())
+        # One write at a time, so an older snapshot can't land last.
+        async with self._flush_lock:
+            await self._loop.run_in_executor(
+                None, self._write_index, entries)
+
+    def _freshness(self, headers):
+        cache_control = parse_cache_control(
+            get_header(headers, 'cache-control'))
+        # no-cache responses must be revalidated, which a replay can't do.
+        if 'no-store' in cache_control or 'no-cache' in cache_control:
+            return None
+        if not is_replayable_vary(get_header(headers, 'vary')):
+            return None
+        date = parse_http_date(get_header(headers, 'date')) or time.time()
+        if 'max-age' in cache_control:
+            try:
+                ttl = int(cache_control['max-age'])
+            except ValueError:
+                return None
+            try:
+                ttl -= int(get_header(headers, 'age') or 0)
+            except ValueError:
+                pass
+        elif get_header(headers, 'expires') is not None:
+            expires = parse_http_date(get_header(headers, 'expires'))
+            ttl = expires - date if expires else 0
+        elif get_header(headers, 'last-modified') is not None:
+            # RFC 7234 heuristic: a tenth of the time since last change.
+            modified = parse_http_date(get_header(headers, 'last-modified'))
+            ttl = (date - modified) / 10 if modified else 0
+        else:
+            ttl = self._default_ttl
+        if self._max_ttl is not None:
+            ttl = min(ttl, self._max_ttl)
+        return ttl if ttl > 0 else None
+
+    def _body_path(self, digest):
+        return os.path.join(self._path, digest)
+
+    def _write_body(self, digest, body):
+        with open(self._body_path(digest), 'wb') as fl:
+            fl.write(body)
+
+    def _write_index(self, entries):
+        path = os.path.join(self._path, 'index.json')
+        with open(path + '.tmp', 'w') as fl:
+            json.dump(entries, fl)
+        os.replace(path + '.tmp', path)
+
+    def _read_body(self, digest):
+        with open(self._body_path(digest), 'rb') as fl:
+            return fl.read()
+
+    def _remove(self, digest):
+        entry = self._index.pop(digest, None)
+        if not entry:
+            return
+        self._size -= entry['size']
+        try:
+            os.remove(self._body_path(digest))
+        except OSError:
+            pass
+
+    def _evict(self):
+        # Expired entries go when they are next looked up; only the size
+        # limit is enforced here.
+        while self._size > self._max_size and self._index:
+            self._remove(next(iter(self._index)))
+
+    def _schedule_flush(self):
+        if not self._flush_handle:
+            self._flush_handle = self._loop.call_later(
+                1, self._flush_in_background)
+
+    def _flush_in_background(self):
+        self._flush_handle = None
+        future = asyncio.ensure_future(self.flush())
+        future.add_done_callback(
+            lambda fut: fut.cancelled() or fut.exception())
+
+    def _load(self):
+        try:
+            with open(os.path.join(self._path, 'index.json')) as fl:
+                entries = json.load(fl)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for digest, entry in entries:
+            if entry['expires'] <= now or not is_replayable_vary(
+                    get_header(entry['headers'], 'vary')):
+                try:
+                    os.remove(self._body_path(digest))
+                except OSError:
+                    pass
+            elif os.path.exists(self._body_path(digest)):
+                self._index[digest] = entry
+                self._size += entry['size']
+        self._evict()
@@ -0,0 +1,79 @@
+import collections
+import time
+
+
+# Pairs requestWillBeSent request ids with the requestIntercepted events
+# of the same request. Both sides queue per request hash in arrival order,
+# so identical requests pair up first in, first out. Entries whose other
+# half never arrives are dropped once older than max_age seconds or when
+# the index grows past max_size.
+class InterceptionIndex(object):
+
+    def __init__(self, max_size=1000, max_age=30, clock=time.monotonic):
+        self._max_size = max_size
+        self._max_age = max_age
+        self._clock = clock
+        self._request_ids = {}
+        self._interceptions = {}
+        # Every entry in insertion order, for expiry. Entries are
+        # [timestamp, queues, key, value, alive].
+        self._entries = collections.deque()
+        self._size = 0
+
+    def add_request_id(self, key, request_id):
+        return self._add(self._request_ids, key, request_id)
+
+    def add_interception(self, key, interception):
+        return self._add(self._interceptions, key, interception)
+
+    def size(self):
+        return self._size
+
+    def clear(self):
+        self._request_ids.clear()
+        self._interceptions.clear()
+        self._entries.clear()
+        self._size = 0
+
+    def _add(self, queues, key, value):
+        now = self._clock()
+        self._expire(now)
+        entry = [now, queues, key, value, True]
+        queue = queues.get(key)
+        if queue is None:
+            queue = queues[key] = collections.deque()
+        queue.append(entry)
+        self._entries.append(entry)
+        self._size += 1
+        return self._pair(key)
+
+    def _pair(self, key):
+        request_ids = self._request_ids.get(key)
+        interceptions = self._interceptions.get(key)
+        if not request_ids or not interceptions:
+            return None
+        request_id = self._pop(self._request_ids, key)
+        interception = self._pop(self._interceptions, key)
+        return request_id, interception
+
+    def _pop(self, queues, key):
+        queue = queues[key]
+        entry = queue.popleft()
+        if not queue:
+            del queues[key]
+        entry[4] = False
+        self._size -= 1
+        return entry[3]
+
+    def _expire(self, now):
+        entries = self._entries
+        while entries:
+            entry = entries[0]
+            if entry[4]:
+                expired = now - entry[0] > self._max_age
+                if not expired and self._size < self._max_size:
+                    return
+                # The oldest live entry overall is also the oldest of its
+                # own key, so it sits at the front of that queue.
+                self._pop(entry[1], entry[2])
+            entries.popleft()
@@ -0,0 +1,181 @@
+import asyncio
+import itertools
+import weakref
+
+from pyppeteer.helper import Helper
+
+
+class JSHandle(object):
+
+    def __init__(self, frame, client, remote_object, scope=None):
+        self._frame = frame
+        self._client = client
+        self._remote_object = remote_object
+        self._scope = scope
+        self._disposed = False
+        self._finalizer = None
+        if scope:
+            scope._handles.append(self)
+        elif 'objectId' in remote_object:
+            # Handles outside a scope still belong to their context's object
+            # group, released when the context goes away; this releases the
+            # ones that are dropped undisposed before that.
+            self._finalizer = weakref.finalize(
+                self, JSHandle._release_later, client,
+                remote_object['objectId'])
+            self._finalizer.atexit = False
+
+    @staticmethod
+    def _release_later(client, object_id):
+        try:
+            future = asyncio.ensure_future(client.send(
+                'Runtime.releaseObject', {'objectId': object_id}))
+        except RuntimeError:
+            return
+        future.add_done_callback(
+            lambda fut: fut.cancelled() or fut.exception())
+
+    def remote_object(self):
+        return self._remote_object
+
+    def as_element(self):
+        return None
+
+    async def get_property(self, property_name):
+        assert not self._disposed, 'JSHandle is disposed'
+        if 'objectId' in self._remote_object:
+            params = {
+                'objectId': self._remote_object['objectId'],
+                'functionDeclaration':
+                    'function(name) { return this[name]; }',
+                'arguments': [{'value': property_name}]
+            }
+        else:
+            # Primitives have no object to call on; pass the value along.
+            value = {
+                key: self._remote_object[key]
+                for key in ('value', 'unserializableValue')
+                if key in self._remote_object
+            }
+            params = {
+                'executionContextId': self._frame._default_context_id,
+                'functionDeclaration':
+                    'function(value, name) { return value[name]; }',
+                'arguments': [value, {'value': property_name}]
+            }
+        params['returnByValue'] = False
+        params['objectGroup'] = self._frame._object_group(self._scope)
+        res = await self._client.send('Runtime.callFunctionOn', params)
+        if 'exceptionDetails' in res and res['exceptionDetails']:
+            raise Exception('Evaluation failed: {}'.format(
+                Helper.get_exception_message(res['exceptionDetails'])))
+        return self._frame._create_handle(res['result'], self._scope)
+
+    async def get_properties(self):
+        assert not self._disposed, 'JSHandle is disposed'
+        if 'objectId' not in self._remote_object:
+            return {}
+        # Property handles land in the object group of this handle, so a
+        # scope releases them along with it.
+        res = await self._client.send('Runtime.getProperties', {
+            'objectId': self._remote_object['objectId'],
+            'ownProperties': True
+        })
+        result = {}
+        for prop in res['result']:
+            if not prop.get('enumerable') or 'value' not in prop:
+                continue
+            result[prop['name']] = self._frame._create_handle(
+                prop['value'], self._scope)
+        return result
+
+    async def json_value(self):
+        assert not self._disposed, 'JSHandle is disposed'
+        if 'objectId' not in self._remote_object:
+            return await Helper.serialize_remote_object(
+                self._client, self._remote_object)
+        try:
+            res = await self._client.send('Runtime.callFunctionOn', {
+                'objectId': self._remote_object['objectId'],
+                'functionDeclaration': 'function() { return this; }',
+                'returnByValue': True,
+                'awaitPromise': True
+            })
+        except Exception as e:
+            if not Helper.is_by_value_error(e):
+                raise
+            raise Exception(
+                'Evaluation failed: result is not serializable: {}'.format(e))
+        if 'exceptionDetails' in res and res['exceptionDetails']:
+            raise Exception('Evaluation failed: {}'.format(
+                Helper.get_exception_message(res['exceptionDetails'])))
+        return await Helper.serialize_remote_object(
+            self._client, res['result'])
+
+    async def dispose(self):
+        if self._disposed:
+            return
+        self._disposed = True
+        if self._finalizer:
+            self._finalizer.detach()
+        await Helper.release_object(self._client, self._remote_object)
+
+    def __repr__(self):
+        if 'objectId' in self._remote_object:
+            return 'JSHandle@{}'.format(
+                self._remote_object.get('subtype') or
+                self._remote_object['type'])
+        return 'JSHandle:{}'.format(self._remote_object.get('value'))
+
+
+class HandleScope(object):
+
+    _ids = itertools.count(1)
+
+    # Every handle created through a scope shares one object group, released
+    # with a single Runtime.releaseObjectGroup when the scope exits:
+    #
+    #   async with page.handle_scope() as scope:
+    #       body = await scope.evaluate_handle('() => document.body')
+    def __init__(self, frame, client):
+        self._frame = frame
+        self._client = client
+        self._object_group = 'pyppeteer-scope-{}'.format(
+            next(HandleScope._ids))
+        self._handles = []
+        self._released = False
+
+    def object_group(self):
+        return self._object_group
+
+    async def evaluate_handle(self, page_function, *args):
+        assert not self._released, 'HandleScope is released'
+        return await self._frame._evaluate_handle(page_function, args, self)
+
+    async def S(self, selector):
+        assert not self._released, 'HandleScope is released'
+        return await self._frame._query_selector(selector, self)
+
+    async def SS(self, selector):
+        assert not self._released, 'HandleScope is released'
+        return await self._frame._query_selector_all(selector, self)
+
+    async def release(self):
+        if self._released:
+            return
+        self._released = True
+        for handle in self._handles:
+            handle._disposed = True
+        self._handles = []
+        try:
+            await self._client.send('Runtime.releaseObjectGroup', {
+                'objectGroup': self._object_group
+            })
+        except Exception:
+            pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.release()
@@ -43,11 +43,43 @@ def randbytes(n):
 async def wait_for_ws_endpoint(chrome_process):
     while True:
         line = await chrome_process.stderr.readline()
+        if not line:
+            # Chrome exited before printing the endpoint.
+            return None
         match = re.search(regex, line.decode('utf-8'))
         if match:
             return match.groups()[0]
 
 
+async def drain_pipe(stream):
+    # Chrome keeps logging to stderr; an unread pipe fills up and
+    # eventually blocks a long lived browser.
+    while await stream.read(65536):
+        pass
+
+
+# Kill callbacks of the browsers still running, all run by one SIGTERM
+# handler however many browsers are launched.
+chrome_kills = set()
+previous_sigterm_handler = None
+
+
+def on_sigterm(signum, frame):
+    for chrome_kill in list(chrome_kills):
+        chrome_kill()
+    if callable(previous_sigterm_handler):
+        previous_sigterm_handler(signum, frame)
+    elif previous_sigterm_handler == signal.SIG_DFL:
+        sys.exit(128 + signum)
+
+
+def install_sigterm_handler():
+    global previous_sigterm_handler
+    if signal.getsignal(signal.SIGTERM) is on_sigterm:
+        return
+    previous_sigterm_handler = signal.signal(signal.SIGTERM, on_sigterm)
+
+
 class Launcher(object):
 
     @staticmethod
@@ -70,6 +102,8 @@ class Launcher(object):
             'mac-494755/chrome-mac/Chromium.app/Contents/'
             'MacOS/Chromium'
         )
+        if 'executablePath' in options and options['executablePath']:
+            chrome_executable = options['executablePath']
         if 'headless' not in options or options['headless']:
             chrome_arguments.append('--headless')
             chrome_arguments.append('--disable-gpu')
@@ -101,7 +135,7 @@ class Launcher(object):
             process = await asyncio.create_subprocess_exec(
                 *[exe, *args],
                 stderr=asyncio.subprocess.PIPE,
-                stdout=asyncio.subprocess.PIPE
+                stdout=asyncio.subprocess.DEVNULL
             )
             return process
         chrome_process = await get_process(chrome_executable, chrome_arguments)
@@ -110,28 +144,61 @@ class Launcher(object):
 
         def chrome_kill():
             print('Killing chrome')
-            proc_list[0].kill()
-            shutil.rmtree(user_data_dir)
+            chrome_kills.discard(chrome_kill)
+            if proc_list[0].returncode is None:
+                proc_list[0].kill()
+            shutil.rmtree(user_data_dir, ignore_errors=True)
 
-        signal.signal(signal.SIGTERM, chrome_kill)
+        chrome_kills.add(chrome_kill)
+        install_sigterm_handler()
         terminated = False
 
-        browser_ws_endpoint = await wait_for_ws_endpoint(chrome_process)
+        timeout = (options['timeout'] if 'timeout' in options
+                   else 30000) / 1000
+        try:
+            browser_ws_endpoint = await asyncio.wait_for(
+                wait_for_ws_endpoint(chrome_process), timeout)
+        except asyncio.TimeoutError:
+            browser_ws_endpoint = None
         if not browser_ws_endpoint:
-            chrome_process.kill()
-            shutil.rmtree(user_data_dir)
+            if chrome_process.returncode is None:
+                chrome_process.kill()
+            shutil.rmtree(user_data_dir, ignore_errors=True)
             raise Exception('Failed to connect to chrome')
+        drain = asyncio.ensure_future(drain_pipe(chrome_process.stderr))
+        drain.add_done_callback(
+            lambda fut: fut.cancelled() or fut.exception())
 
         connection_delay = options['sloMo'] if 'sloMo' in options else 0
+        flatten = True if (
+            'flattenSessions' in options and options['flattenSessions']
+            ) else False
+        codec = options['jsonCodec'] if 'jsonCodec' in options else None
         connection = await Connection.create(
-            browser_ws_endpoint, connection_delay, loop=asyncio_loop
+            browser_ws_endpoint, connection_delay, loop=asyncio_loop,
+            flatten=flatten, codec=codec
         )
         ignore_https_errors = True if (
             'ignoreHTTPSErrors' in options and options['ignoreHTTPSErrors']
             ) else False
-        return Browser(connection, ignore_https_errors, chrome_kill)
+        lazy_domains = True if (
+            'lazyDomains' in options and options['lazyDomains']
+            ) else False
+        page_pool_size = options['pagePoolSize'] \
+            if 'pagePoolSize' in options else 0
+        screenshot_concurrency = options['screenshotConcurrency'] \
+            if 'screenshotConcurrency' in options else 4
+        browser = Browser(
+            connection, ignore_https_errors, chrome_kill, lazy_domains,
+            process=chrome_process, page_pool_size=page_pool_size,
+            screenshot_concurrency=screenshot_concurrency)
+        await browser.fill_page_pool()
+        return browser
 
     @staticmethod
-    async def connect(browser_ws_endpoint, ignore_https_errors=False):
-        connection = await Connection.create(browser_ws_endpoint)
+    async def connect(
+            browser_ws_endpoint, ignore_https_errors=False, flatten=False,
+            codec=None):
+        connection = await Connection.create(
+            browser_ws_endpoint, flatten=flatten, codec=codec)
         return Browser(connection, ignore_https_errors)
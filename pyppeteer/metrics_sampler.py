@@ -0,0 +1,108 @@
+import array
+import asyncio
+import time
+
+
+class MetricsSampler(object):
+
+    DefaultMetrics = (
+        'JSHeapUsedSize',
+        'JSHeapTotalSize',
+        'Nodes',
+        'Documents',
+        'LayoutCount',
+        'RecalcStyleCount',
+        'LayoutDuration',
+        'RecalcStyleDuration',
+        'ScriptDuration',
+        'TaskDuration',
+    )
+
+    # Options:
+    #   'interval': milliseconds between samples, 1000 by default
+    #   'metrics': names from Performance.getMetrics to keep
+    #   'maxSamples': samples kept per metric, oldest dropped first
+    def __init__(self, page, options={}):
+        self._page = page
+        self._interval = (options['interval']
+                          if 'interval' in options else 1000) / 1000
+        self._metrics = tuple(
+            options['metrics'] if 'metrics' in options
+            else MetricsSampler.DefaultMetrics)
+        self._max_samples = options['maxSamples'] \
+            if 'maxSamples' in options else 600
+        # One flat array of doubles per column, used as a ring buffer.
+        self._columns = {
+            name: array.array('d', bytes(8 * self._max_samples))
+            for name in ('timestamp',) + self._metrics
+        }
+        self._next = 0
+        self._count = 0
+        self._task = None
+
+    def start(self):
+        assert not self._task, 'Metrics sampling is already started'
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if not self._task:
+            return
+        task = self._task
+        self._task = None
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
+
+    def is_running(self):
+        return bool(self._task) and not self._task.done()
+
+    def __len__(self):
+        return self._count
+
+    def series(self):
+        # Oldest sample first, as {'timestamp': [...], metric: [...]}.
+        start = (self._next - self._count) % self._max_samples
+        indexes = [
+            (start + offset) % self._max_samples
+            for offset in range(self._count)
+        ]
+        return {
+            name: [column[index] for index in indexes]
+            for name, column in self._columns.items()
+        }
+
+    def summary(self):
+        result = {}
+        for name, values in self.series().items():
+            if name == 'timestamp' or not values:
+                continue
+            result[name] = {
+                'min': min(values),
+                'max': max(values),
+                'mean': sum(values) / len(values),
+                'last': values[-1],
+            }
+        return result
+
+    def add_sample(self, metrics, timestamp=None):
+        index = self._next
+        self._columns['timestamp'][index] = \
+            timestamp if timestamp is not None else time.time()
+        for name in self._metrics:
+            self._columns[name][index] = metrics.get(name, 0)
+        self._next = (index + 1) % self._max_samples
+        self._count = min(self._count + 1, self._max_samples)
+
+    async def _run(self):
+        while not self._page.is_closed():
+            started = time.monotonic()
+            try:
+                metrics = await self._page.metrics()
+            except Exception:
+                # The page went away between two samples.
+                return
+            self.add_sample(metrics)
+            await asyncio.sleep(
+                max(self._interval - (time.monotonic() - started), 0))
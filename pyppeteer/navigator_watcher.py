@@ -8,58 +8,70 @@ class NavigatorWatcher(object):
 
     def __init__(
             self, client, ignore_https_errors,
-            options={}, loop=asyncio_loop):
+            options={}, network_idle=None, loop=asyncio_loop):
         self._client = client
         self._ignore_https_errors = ignore_https_errors
-        self._timeout = 3
+        self._network_idle = network_idle
+        self._timeout = 30
         self._loop = loop
         if 'timeout' in options and isinstance(options['timeout'], int):
             self._timeout = options['timeout']/1000
-        self._idle_time = 1
+        idle_time = 1000
         if 'networkIdleTimeout' in options and \
                 isinstance(options['networkIdleTimeout'], int):
-            self._idle_time = options['networkIdleTimeout']/1000
-        self._idle_timer = None
-        self._idle_inflight = 2
+            idle_time = options['networkIdleTimeout']
+        idle_inflight = 2
         if 'networkIdleInflight' in options and \
                 isinstance(options['networkIdleInflight'], int):
-            self._idle_inflight = options['networkIdleInflight']
+            idle_inflight = options['networkIdleInflight']
+        self._idle_options = {
+            'profiles': [{'inflight': idle_inflight, 'idleTime': idle_time}],
+            'afterActivity': True
+        }
+        if 'networkIdleProfiles' in options:
+            self._idle_options['profiles'] = options['networkIdleProfiles']
+        if 'networkIdleIgnore' in options:
+            self._idle_options['ignore'] = options['networkIdleIgnore']
         self._wait_until = 'load'
         if 'waitUntil' in options and \
-                isinstance(options['waitUntil'], (str, unicode)):
+                isinstance(options['waitUntil'], str):
             self._wait_until = options['waitUntil']
         assert self._wait_until == 'load' or self._wait_until == 'networkidle'
+        assert self._wait_until == 'load' or network_idle, \
+            'networkidle needs a network idle tracker'
 
-    def _watchdog_cb(self, future):
-        if future.cancelled():
+        self._event_listeners = []
+        self._maximum_timer = None
+        self._task = None
+
+    def _timeout_cb(self, future):
+        if future.done():
             return
-        future.set_result(None)
+        future.set_exception(Exception(
+            'Navigation Timeout Exceeded: {}ms exceeded'.format(
+                int(self._timeout * 1000))))
 
     def _cert_error_cb(self, error):
-        # print('SSL Certificate error: {}'.format(error['errorType']))
-        if self._cert_future.cancelled():
+        if self._cert_future.done():
             return
-        self._cert_future.set_result(None)
-
-    def _load_event_cb(self, *args, **kwargs):
-        # print('Load event cb')
-        # print(args, kwargs)
-        # self._cert_future.set_result(None)
-        pass
+        self._cert_future.set_exception(Exception(
+            'SSL Certificate error: {}'.format(error['errorType'])))
 
-    def _network_idle_cb(self):
-        pass
-
-    async def wait_for_navigation(self):
-        self._request_ids = set()
-        self._event_listeners = []
+    def _load_event_cb(self, event):
+        if self._load_event_fired.done():
+            return
+        self._load_event_fired.set_result(None)
 
-        watchdog = asyncio.Future()
-        self._maximum_timer = watchdog
-        # await asyncio.sleep(self._timeout)
-        self._loop.call_soon(self._watchdog_cb, watchdog)
+    def wait_for_navigation(self):
+        # Listeners are attached before this returns, so the caller can
+        # start the navigation right after without missing any events.
+        navigation_futures = []
 
-        navigation_futures = [watchdog]
+        if self._timeout:
+            watchdog = asyncio.Future()
+            self._maximum_timer = self._loop.call_later(
+                self._timeout, self._timeout_cb, watchdog)
+            navigation_futures.append(watchdog)
 
         if not self._ignore_https_errors:
             cert_error = asyncio.Future()
@@ -73,7 +85,6 @@ class NavigatorWatcher(object):
             navigation_futures.append(cert_error)
 
         if self._wait_until == 'load':
-            # print('Wait until load')
             load_event_fired = asyncio.Future()
             self._load_event_fired = load_event_fired
             listener = Helper.add_event_listener(
@@ -84,84 +95,31 @@ class NavigatorWatcher(object):
             self._event_listeners.append(listener)
             navigation_futures.append(load_event_fired)
         else:
-            # print('Wait until else')
-            self._event_listeners.extend((
-                Helper.add_event_listener(
-                    self._client,
-                    'Network.requestWillBeSent',
-                    self._on_loading_started
-                ),
-                Helper.add_event_listener(
-                    self._client,
-                    'Network.loadingFinished',
-                    self._on_loading_completed
-                ),
-                Helper.add_event_listener(
-                    self._client,
-                    'Network.loadingFailed',
-                    self._on_loading_completed
-                ),
-                Helper.add_event_listener(
-                    self._client,
-                    'Network.webSocketCreated',
-                    self._on_loading_started
-                ),
-                Helper.add_event_listener(
-                    self._client,
-                    'Network.webSocketClosed',
-                    self._on_loading_completed
-                )
-            ))
-            network_idle = asyncio.Future()
-            self._network_idle_future = network_idle
-            navigation_futures.append(network_idle)
+            navigation_futures.append(
+                self._network_idle.wait(self._idle_options))
+
+        self._task = asyncio.ensure_future(
+            self._wait_first(navigation_futures))
+        return self._task
+
+    async def _wait_first(self, futures):
         try:
-            res = self._add_nav_futures_to_loop(navigation_futures)
-            await res
-        except Exception as e:
-            raise e
+            done, pending = await asyncio.wait(
+                futures, return_when=asyncio.FIRST_COMPLETED)
+            for future in pending:
+                future.cancel()
+            return done.pop().result()
         finally:
             self._cleanup()
 
-    def _add_nav_futures_to_loop(self, futures):
-        # print('Add nav future list to loop')
-        main_future = asyncio.Future()
-        asyncio.async(
-            self._start_nav_futures_loop(futures, main_future)
-        )
-        return main_future
-
-    async def _start_nav_futures_loop(self, futures, main_future):
-        # print('Started inf loop')
-        while True:
-            for future in futures:
-                if future.done():
-                    if future.exception():
-                        main_future.set_exception(future.exception())
-                    else:
-                        main_future.set_result(future.result())
-                    return main_future
-
     def cancel(self):
         self._cleanup()
-
-    def _on_loading_started(self, event):
-        self._request_ids.add(event['requestId'])
-        if len(self._request_ids) > self._idle_inflight:
-            if not self._idle_timer:
-                self._idle_timer.cancel()
-            self._idle_timer = None
-
-    def _on_loading_completed(self, event):
-        self._request_ids.remove(event['requestId'])
-        if len(self._request_ids) <= self._idle_inflight and \
-                not self._idle_timer:
-            self._idle_timer = asyncio.Future()
-            self._loop.call_later(self._idle_time, self._network_idle_cb)
+        if self._task:
+            self._task.cancel()
 
     def _cleanup(self):
         Helper.remove_event_listeners(self._event_listeners)
-        if self._idle_timer:
-            self._idle_timer.cancel()
+        self._event_listeners = []
         if self._maximum_timer:
             self._maximum_timer.cancel()
+            self._maximum_timer = None
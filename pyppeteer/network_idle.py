@@ -0,0 +1,132 @@
+import asyncio
+import re
+
+from pyppeteer.helper import Helper
+from pyppeteer.loop import loop as asyncio_loop
+from pyppeteer.network_manager import NetworkManager
+
+
+class NetworkIdleTracker(object):
+
+    # Any one profile holding for its whole idle time counts as idle.
+    DefaultProfiles = [{'inflight': 0, 'idleTime': 500}]
+
+    # Long-polling, websocket and beacon traffic never settles, so it
+    # would keep a page from ever becoming idle.
+    DefaultIgnoreTypes = ('EventSource', 'WebSocket', 'Ping')
+
+    def __init__(self, network_manager, loop=asyncio_loop):
+        self._network_manager = network_manager
+        self._loop = loop
+        self._inflight = set()
+        self._waiters = []
+        self._listeners = [
+            Helper.add_event_listener(
+                network_manager,
+                NetworkManager.Events['Request'],
+                self._on_request
+            ),
+            Helper.add_event_listener(
+                network_manager,
+                NetworkManager.Events['RequestFinished'],
+                self._on_request_done
+            ),
+            Helper.add_event_listener(
+                network_manager,
+                NetworkManager.Events['RequestFailed'],
+                self._on_request_done
+            ),
+        ]
+
+    def inflight(self):
+        return len(self._inflight)
+
+    def wait(self, options={}):
+        profiles = options['profiles'] if 'profiles' in options \
+            else NetworkIdleTracker.DefaultProfiles
+        assert profiles, 'At least one network idle profile is required'
+        ignore_types = options['ignoreTypes'] if 'ignoreTypes' in options \
+            else NetworkIdleTracker.DefaultIgnoreTypes
+        ignore = None
+        if 'ignore' in options and options['ignore']:
+            ignore = re.compile('|'.join(
+                '(?:{})'.format(getattr(pattern, 'pattern', pattern))
+                for pattern in options['ignore']
+            ))
+        waiter = {
+            'future': asyncio.Future(),
+            'profiles': profiles,
+            'timers': [None] * len(profiles),
+            'ignoreTypes': set(ignore_types),
+            'ignore': ignore,
+            'count': 0,
+            # Navigation waiters hold their timers until the navigation's
+            # first request shows up, or they would resolve on the quiet
+            # gap before the document request is even sent.
+            'armed': not ('afterActivity' in options and
+                          options['afterActivity']),
+        }
+        for request in self._inflight:
+            if not self._is_ignored(waiter, request):
+                waiter['count'] += 1
+        self._waiters.append(waiter)
+        waiter['future'].add_done_callback(
+            lambda fut: self._remove_waiter(waiter))
+        self._update(waiter)
+        return waiter['future']
+
+    def dispose(self):
+        Helper.remove_event_listeners(self._listeners)
+        self._listeners = []
+        for waiter in list(self._waiters):
+            waiter['future'].cancel()
+        self._inflight.clear()
+
+    def _is_ignored(self, waiter, request):
+        if request.resource_type in waiter['ignoreTypes']:
+            return True
+        return bool(waiter['ignore'] and waiter['ignore'].search(request.url))
+
+    def _on_request(self, request):
+        self._inflight.add(request)
+        for waiter in self._waiters:
+            if not self._is_ignored(waiter, request):
+                waiter['count'] += 1
+                waiter['armed'] = True
+                self._update(waiter)
+
+    def _on_request_done(self, request):
+        if request not in self._inflight:
+            return
+        self._inflight.discard(request)
+        for waiter in self._waiters:
+            if not self._is_ignored(waiter, request):
+                waiter['count'] -= 1
+                waiter['armed'] = True
+                self._update(waiter)
+
+    def _update(self, waiter):
+        # Timers only change when the count crosses a profile's threshold,
+        # so a busy page costs a comparison per profile and request.
+        if not waiter['armed']:
+            return
+        timers = waiter['timers']
+        for index, profile in enumerate(waiter['profiles']):
+            if waiter['count'] > profile['inflight']:
+                if timers[index]:
+                    timers[index].cancel()
+                    timers[index] = None
+            elif not timers[index]:
+                timers[index] = self._loop.call_later(
+                    profile['idleTime'] / 1000, self._resolve, waiter)
+
+    def _resolve(self, waiter):
+        if not waiter['future'].done():
+            waiter['future'].set_result(None)
+
+    def _remove_waiter(self, waiter):
+        for timer in waiter['timers']:
+            if timer:
+                timer.cancel()
+        if waiter in self._waiters:
+            self._waiters.remove(waiter)
@@ -1,9 +1,13 @@
 import urllib.parse as urlparse
 import json
 import asyncio
+import binascii
+import weakref
 
+from pyppeteer.body_capture import BodyCapture
 from pyppeteer.helper import Helper
-from pyppeteer.multimap import Multimap
+from pyppeteer.interception_index import InterceptionIndex
+from pyppeteer.request_blocker import RequestBlocker
 from pyppeteer.emitter import EventEmitter
 
 
@@ -12,34 +16,40 @@ def remove_url_hash(url):
     return urlparse.urlunparse((scheme, netloc, path, params, query, ''))
 
 
+IGNORED_HASH_HEADERS = frozenset((
+    'Accept',
+    'Referer',
+    'X-DevTools-Emulate-Network-Conditions-Client-Id',
+))
+
+
 def generate_request_hash(request):
-    _hash = {
-        'url': request['url'],
-        'method': request['method'],
-        'postData': request['postData'],
-        'headers': {}
-    }
-    headers = list(request['headers'].keys())
-    headers.sort()
-    for header in headers:
-        if header in [
-                'Accept',
-                'Referer',
-                'X-DevTools-Emulate-Network-Conditions-Client-Id']:
-            continue
-        _hash['headers'][header] = request['headers'][header]
-    return json.dumps(_hash)
+    headers = request['headers']
+    return (
+        request['url'],
+        request['method'],
+        request.get('postData'),
+        frozenset(
+            (name, value) for name, value in headers.items()
+            if name not in IGNORED_HASH_HEADERS
+        )
+    )
 
 
 class Request(object):
 
-    def __init__(self, client, request_id, interception_id, url, payload):
+    def __init__(
+            self, client, request_id, interception_id, url, payload,
+            resource_type=None):
         self._client = client
         self._request_id = request_id
         self._interception_id = interception_id
         self._interception_handled = False
+        # Blocked or answered from the HTTP cache before anyone else saw it.
+        self._settled = False
         self._response = None
         self._complete_promise = asyncio.Future()
+        self._encoded_data_length = None
 
         # async def _complete_promise():
         #     response = await self._client.send('Network.getResponseBody', {
@@ -55,35 +65,30 @@ class Request(object):
         self.method = payload['method']
         self.post_data = payload['postData'] if 'postData' in payload else None
         self.headers = payload['headers']
+        self.resource_type = resource_type
 
     def response(self):
         return self._response
 
-    def continu(self, overrides={}):
-        if self.url.startswith('data:'):
+    async def continu(self, overrides={}):
+        if self.url.startswith('data:') or self._settled:
             return
-        assert self._interception_id
-        assert self._interception_handled
+        assert self._interception_id, 'Request Interception is not enabled!'
+        assert not self._interception_handled, 'Request is already handled!'
         self._interception_handled = True
-        headers = None
-        if 'headers' in overrides:
-            headers = overrides['headers']
-        has_post_data = 'postData' in overrides
-        self._client.send('Network.continueInterceptedRequest', {
-            'interceptionId': self._interception_id,
-            'url': overrides['url'] if 'url' in overrides else None,
-            'method': overrides['method'] if 'method' in overrides else None,
-            'postData': overrides['postData'] if has_post_data else None,
-            'headers': headers
-        })
-
-    def abort(self):
-        if self.url.startswith('data:'):
+        params = {'interceptionId': self._interception_id}
+        for option in ('url', 'method', 'postData', 'headers'):
+            if option in overrides:
+                params[option] = overrides[option]
+        await self._client.send('Network.continueInterceptedRequest', params)
+
+    async def abort(self):
+        if self.url.startswith('data:') or self._settled:
             return
-        assert self._interception_id
-        assert self._interception_handled
+        assert self._interception_id, 'Request Interception is not enabled!'
+        assert not self._interception_handled, 'Request is already handled!'
         self._interception_handled = True
-        self._client.send('Network.continueInterceptedRequest', {
+        await self._client.send('Network.continueInterceptedRequest', {
             'interceptionId': self._interception_id,
             'errorReason': 'Failed'
         })
@@ -91,24 +96,35 @@ class Request(object):
 
 class Response(object):
 
-    def __init__(self, client, request, status, headers):
+    def __init__(self, client, request, status, headers, mime_type=None):
         self._client = client
         self._request = request
         self._content_promise = None
+        # Set once a large body has been written out to disk by BodyCapture.
+        self._body_path = None
 
         self.headers = headers
         self.status = status
         self.ok = status >= 200 and status < 300
         self.url = request.url
+        self.mime_type = mime_type
 
     async def buffer(self):
         if not self._content_promise:
-            await self._request._complete_promise
-            response = await self._client.send('Network.getResponseBody', {
-                'requestId': self._request._request_id
-            })
-            return response['body']
-        return self._content_promise
+            self._content_promise = asyncio.ensure_future(self._read_body())
+        return await self._content_promise
+
+    async def _read_body(self):
+        if self._body_path:
+            with open(self._body_path, 'rb') as fl:
+                return fl.read()
+        await self._request._complete_promise
+        response = await self._client.send('Network.getResponseBody', {
+            'requestId': self._request._request_id
+        })
+        if response['base64Encoded']:
+            return binascii.a2b_base64(response['body'])
+        return response['body'].encode('utf-8')
 
     async def text(self):
         content = await self.buffer()
@@ -139,8 +155,12 @@ class NetworkManager(EventEmitter):
         self._extra_http_headers = {}
 
         self._request_interception_enabled = False
-        self._request_hash_to_request_ids = Multimap()
-        self._request_hash_to_interceptions = Multimap()
+        self._request_blocker = RequestBlocker()
+        self._http_cache = None
+        self._interception_enabled = False
+        self._interception_index = InterceptionIndex()
+        # Running captures, so a pooled page can stop the previous user's.
+        self._body_captures = weakref.WeakSet()
 
         self._client.on(
             'Network.requestWillBeSent',
@@ -160,8 +180,9 @@ class NetworkManager(EventEmitter):
 
     async def set_extra_http_headers(self, extra_http_headers):
         self._extra_http_headers = extra_http_headers
-        await self._client.send(
-            'Network.setExtraHTTPHeaders', extra_http_headers)
+        await self._client.send('Network.setExtraHTTPHeaders', {
+            'headers': extra_http_headers
+        })
 
     def extra_http_headers(self):
         return self._extra_http_headers
@@ -172,14 +193,69 @@ class NetworkManager(EventEmitter):
         })
 
     async def set_request_interception_enabled(self, value):
+        self._request_interception_enabled = not not value
+        await self._update_request_interception()
+
+    async def set_request_blocking(self, rules):
+        self._request_blocker = RequestBlocker(rules)
+        await self._client.send('Network.setBlockedURLs', {
+            'urls': self._request_blocker.blocked_urls()
+        })
+        await self._update_request_interception()
+
+    def capture_bodies(self, options={}):
+        capture = BodyCapture(self, options)
+        capture.start()
+        self._body_captures.add(capture)
+        return capture
+
+    async def close_body_captures(self):
+        for capture in list(self._body_captures):
+            await capture.close()
+        self._body_captures.clear()
+
+    async def set_http_cache(self, http_cache):
+        self._http_cache = http_cache
+        await self._update_request_interception()
+
+    def http_cache(self):
+        return self._http_cache
+
+    def request_blocking_enabled(self):
+        return not self._request_blocker.is_empty()
+
+    async def _update_request_interception(self):
+        # Any one Chrome build only knows one of setRequestInterceptionEnabled
+        # and its pattern based successor; stick to the one the bundled
+        # revision has.
+        enabled = bool(
+            self._request_interception_enabled or self._http_cache or
+            self._request_blocker.needs_interception())
+        if enabled == self._interception_enabled:
+            return
         await self._client.send('Network.setRequestInterceptionEnabled', {
-            'enabled': not not value
+            'enabled': enabled
         })
-        self._request_interception_enabled = value
+        self._interception_enabled = enabled
 
     def _on_request_intercepted(self, event):
         event['request']['url'] = remove_url_hash(event['request']['url'])
 
+        if not self._request_interception_enabled:
+            # Only the request blocker or the cache is intercepting; settle
+            # the request right away, no Request object needed.
+            redirect = 'redirectStatusCode' in event and \
+                event['redirectStatusCode']
+            if not self._settle_interception(
+                    event['interceptionId'],
+                    event['request'],
+                    event.get('resourceType'),
+                    not redirect):
+                self._send_interception_response({
+                    'interceptionId': event['interceptionId']
+                })
+            return
+
         if 'redirectStatusCode' in event and event['redirectStatusCode']:
             request = self._interception_id_to_request.get(
                 event['interceptionId'], None)
@@ -192,14 +268,16 @@ class NetworkManager(EventEmitter):
                 event['redirectStatusCode'],
                 event['redirectHeaders'])
             self._handle_request_start(
-                request['_requestId'],
+                request._request_id,
                 event['interceptionId'],
                 event['redirectUrl'],
-                event['request'])
+                event['request'],
+                event.get('resourceType'),
+                False)
             return
         request_hash = generate_request_hash(event['request'])
-        self._request_hash_to_interceptions.set(request_hash, event)
-        self._maybe_resolve_interception(request_hash)
+        self._maybe_resolve_interception(
+            self._interception_index.add_interception(request_hash, event))
 
     def _handle_request_redirect(
             self, request, redirect_status, redirect_headers):
@@ -215,22 +293,64 @@ class NetworkManager(EventEmitter):
         self.emit(NetworkManager.Events['RequestFinished'], request)
 
     def _handle_request_start(
-            self, request_id, interception_id, url, request_payload):
+            self, request_id, interception_id, url, request_payload,
+            resource_type=None, cacheable=True):
         request = Request(
-            self._client, request_id, interception_id, url, request_payload)
+            self._client, request_id, interception_id, url, request_payload,
+            resource_type)
+        if interception_id and self._settle_interception(
+                interception_id, dict(request_payload, url=url),
+                resource_type, cacheable):
+            request._settled = True
+            request._interception_handled = True
         self._request_id_to_request[request_id] = request
         self._interception_id_to_request[interception_id] = request
         self.emit(NetworkManager.Events['Request'], request)
 
+    def _settle_interception(
+            self, interception_id, request_payload, resource_type, cacheable):
+        # Blocks the request or answers it from the HTTP cache; returns
+        # whether it did either.
+        params = {'interceptionId': interception_id}
+        if self._request_blocker.matches(
+                request_payload['url'], resource_type):
+            params['errorReason'] = 'BlockedByClient'
+        elif self._http_cache and cacheable:
+            digest = self._http_cache.lookup(request_payload)
+            if digest is None:
+                return False
+            future = asyncio.ensure_future(
+                self._send_cached_response(params, digest))
+            future.add_done_callback(
+                lambda fut: fut.cancelled() or fut.exception())
+            return True
+        else:
+            return False
+        self._send_interception_response(params)
+        return True
+
+    async def _send_cached_response(self, params, digest):
+        raw_response = await self._http_cache.raw_response(digest)
+        # If the entry went away meanwhile the request goes to the network.
+        if raw_response is not None:
+            params['rawResponse'] = raw_response
+        await self._client.send('Network.continueInterceptedRequest', params)
+
+    def _send_interception_response(self, params):
+        future = asyncio.ensure_future(self._client.send(
+            'Network.continueInterceptedRequest', params))
+        future.add_done_callback(
+            lambda fut: fut.cancelled() or fut.exception())
+
     def _on_request_will_be_sent(self, event):
         if self._request_interception_enabled and \
                 not event['request']['url'].startswith('data:'):
             if 'redirectResponse' in event and event['redirectResponse']:
                 return
             request_hash = generate_request_hash(event['request'])
-            self._request_hash_to_request_ids.set(
-                request_hash, event['requestId'])
-            self._maybe_resolve_interception(request_hash)
+            self._maybe_resolve_interception(
+                self._interception_index.add_request_id(
+                    request_hash, event['requestId']))
             return
         if 'redirectResponse' in event and event['redirectResponse']:
             request = self._request_id_to_request.get(event['requestId'])
@@ -242,22 +362,19 @@ class NetworkManager(EventEmitter):
             event['requestId'],
             None,
             event['request']['url'],
-            event['request'])
-
-    def _maybe_resolve_interception(self, request_hash):
-        request_id = self._request_hash_to_request_ids.first_value(
-            request_hash)
-        interception = self._request_hash_to_interceptions.first_value(
-            request_hash)
-        if not request_id or not interception:
+            event['request'],
+            event.get('type'))
+
+    def _maybe_resolve_interception(self, pair):
+        if not pair:
             return
-        self._request_hash_to_request_ids.delete(request_hash, request_id)
-        self._request_hash_to_interceptions.delete(request_hash, interception)
+        request_id, interception = pair
         self._handle_request_start(
             request_id,
             interception['interceptionId'],
             interception['request']['url'],
-            interception['request'])
+            interception['request'],
+            interception.get('resourceType'))
 
     def _on_response_received(self, event):
         request = self._request_id_to_request.get(event['requestId'], {})
@@ -266,7 +383,8 @@ class NetworkManager(EventEmitter):
         response = Response(
             self._client, request,
             event['response']['status'],
-            event['response']['headers'])
+            event['response']['headers'],
+            event['response'].get('mimeType'))
         request._response = response
         self.emit(NetworkManager.Events['Response'], response)
 
@@ -275,11 +393,14 @@ class NetworkManager(EventEmitter):
         if not request:
             return
         request._complete_promise.set_result(None)
-        try:
-            del self._request_id_to_request[event['requestId']]
-            del self._interception_id_to_request[event['interceptionId']]
-        except KeyError:
-            pass
+        request._encoded_data_length = event['encodedDataLength']
+        del self._request_id_to_request[event['requestId']]
+        self._interception_id_to_request.pop(request._interception_id, None)
+        if self._http_cache and request.response():
+            future = asyncio.ensure_future(
+                self._http_cache.store(request.response()))
+            future.add_done_callback(
+                lambda fut: fut.cancelled() or fut.exception())
         self.emit(NetworkManager.Events['RequestFinished'], request)
 
     def _on_loading_failed(self, event):
@@ -287,9 +408,6 @@ class NetworkManager(EventEmitter):
         if not request:
             return
         request._complete_promise.set_result(None)
-        try:
-            del self._request_id_to_request[event['requestId']]
-            del self._interception_id_to_request[event['interceptionId']]
-        except KeyError:
-            pass
+        del self._request_id_to_request[event['requestId']]
+        self._interception_id_to_request.pop(request._interception_id, None)
         self.emit(NetworkManager.Events['RequestFailed'], request)
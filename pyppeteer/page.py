@@ -1,15 +1,43 @@
 import asyncio
+import io
 import math
-import base64
+import binascii
 import mimetypes
+import weakref
 
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from pyppeteer.coverage import Coverage
 from pyppeteer.emitter import EventEmitter
+from pyppeteer.har import HARRecorder
 from pyppeteer.helper import Helper
 from pyppeteer.input import Keyboard, Mouse
 from pyppeteer.frame_manager import FrameManager
 from pyppeteer.network_manager import NetworkManager
 from pyppeteer.navigator_watcher import NavigatorWatcher
+from pyppeteer.network_idle import NetworkIdleTracker
 from pyppeteer.emulation_manager import EmulationManager
+from pyppeteer.metrics_sampler import MetricsSampler
+from pyppeteer.screencast import Screencast
+from pyppeteer.screenshot_scheduler import ScreenshotScheduler
+from pyppeteer.tracing import Tracing
+
+# Base64 characters decoded per step when streaming a screenshot out; must
+# be a multiple of 4.
+SCREENSHOT_CHUNK_SIZE = 1024 * 1024
+
+
+def base64_chunks(data, chunk_size=SCREENSHOT_CHUNK_SIZE):
+    for start in range(0, len(data), chunk_size):
+        yield binascii.a2b_base64(data[start:start + chunk_size])
+
+
+def base64_decoded_size(data):
+    padding = 2 if data.endswith('==') else 1 if data.endswith('=') else 0
+    return len(data) // 4 * 3 - padding
 
 
 class Page(EventEmitter):
@@ -29,41 +57,75 @@ class Page(EventEmitter):
         'Load': 'load',
     }
 
+    # Protocol domain each page event depends on, for lazy domain mode.
+    EventDomains = {
+        Events['Console']: 'Runtime',
+        Events['Dialog']: 'Page',
+        Events['PageError']: 'Runtime',
+        Events['Request']: 'Network',
+        Events['Response']: 'Network',
+        Events['RequestFailed']: 'Network',
+        Events['RequestFinished']: 'Network',
+        Events['FrameAttached']: 'Page',
+        Events['FrameDetached']: 'Page',
+        Events['FrameNavigated']: 'Page',
+        Events['Load']: 'Page',
+    }
+
+    DefaultViewport = {'width': 800, 'height': 600}
+
     @staticmethod
-    async def create(client, ignore_https_errors, screenshot_task_queue):
-        await asyncio.gather(
-            client.send('Network.enable', {}),
-            client.send('Page.enable', {}),
-            client.send('Runtime.enable', {}),
-            client.send('Security.enable', {})
-        )
+    async def create(
+            client, ignore_https_errors, screenshot_task_queue,
+            lazy_domains=False):
+        if not lazy_domains:
+            await asyncio.gather(
+                client.require_domain('Network'),
+                client.require_domain('Page'),
+                client.require_domain('Runtime'),
+                client.require_domain('Security')
+            )
         if ignore_https_errors:
+            await client.require_domain('Security')
             await client.send('Security.setOverrideCertificateErrors', {
                 'override': True
             })
-        page = Page(client, ignore_https_errors, screenshot_task_queue)
+        page = Page(
+            client, ignore_https_errors, screenshot_task_queue, lazy_domains)
+        client.set_lazy_domains(lazy_domains)
         await page.goto('about:blank')
-        await page.set_viewport({'width': 800, 'height': 600})
+        await page.set_viewport(Page.DefaultViewport)
         return page
 
     def __init__(
             self, client,
             ignore_https_errors=True,
-            screenshot_task_queue=None):
+            screenshot_task_queue=None,
+            lazy_domains=False):
         super().__init__()
         self._client = client
+        self._lazy_domains = lazy_domains
+        self._closed = False
         self._keyborad = Keyboard(client)
         self._mouse = Mouse(client, self._keyborad)
         self._frame_manager = FrameManager(client, self._mouse)
         self._network_manager = NetworkManager(client)
+        self._network_idle = NetworkIdleTracker(self._network_manager)
         self._emulation_manager = EmulationManager(client)
 
-        self._tracing = None
+        self._tracing = Tracing(client)
+        self._har = HARRecorder(client)
+        self._coverage = Coverage(client)
+        # Running screencasts and metrics samplers, stopped when a pooled
+        # page is reset.
+        self._screencasts = weakref.WeakSet()
+        self._metrics_samplers = weakref.WeakSet()
 
         self._page_bindings = {}
         self._ignore_https_errors = ignore_https_errors
 
-        self._screenshot_task_queue = screenshot_task_queue
+        self._screenshot_task_queue = \
+            screenshot_task_queue or ScreenshotScheduler()
 
         self._frame_manager.on(
             FrameManager.Events['FrameAttached'],
@@ -120,9 +182,28 @@ class Page(EventEmitter):
             self._on_target_crashed
         )
 
+    def on(self, event, callback):
+        super().on(event, callback)
+        if self._lazy_domains and event in Page.EventDomains:
+            self._client.retain_domain(Page.EventDomains[event])
+
+    def remove_listener(self, event, cb):
+        count = self.listener_count(event)
+        super().remove_listener(event, cb)
+        if self._lazy_domains and event in Page.EventDomains:
+            for _ in range(count - self.listener_count(event)):
+                self._client.release_domain(Page.EventDomains[event])
+
+    def remove_all_listeners(self):
+        if self._lazy_domains:
+            for event, callbacks in self._events.items():
+                if event in Page.EventDomains:
+                    for _ in callbacks:
+                        self._client.release_domain(Page.EventDomains[event])
+        super().remove_all_listeners()
+
     def _get_scope(self, responses):
         def _tmp(response):
-            print('Resp cb----------')
             responses[response.url] = response
         return _tmp
 
@@ -140,50 +221,112 @@ class Page(EventEmitter):
     def tracing(self):
         return self._tracing
 
+    @property
+    def har(self):
+        return self._har
+
+    @property
+    def coverage(self):
+        return self._coverage
+
     def frames(self):
         return self._frame_manager.frames()
 
     async def set_request_interception_enabled(self, value):
+        await self._client.require_domain('Network')
         return await self._network_manager.set_request_interception_enabled(
             value)
 
+    async def set_request_blocking(self, rules):
+        await self._client.require_domain('Network')
+        return await self._network_manager.set_request_blocking(rules)
+
+    async def set_http_cache(self, http_cache):
+        await self._client.require_domain('Network')
+        return await self._network_manager.set_http_cache(http_cache)
+
+    async def capture_bodies(self, options={}):
+        await self._client.require_domain('Network')
+        return self._network_manager.capture_bodies(options)
+
+    async def set_extra_http_headers(self, headers):
+        return await self._network_manager.set_extra_http_headers(headers)
+
     def _on_certificate_error(self, event):
         print(event)
 
-    async def S(selector):
-        return self.main_frame().S(selector)
+    async def S(self, selector):
+        return await self.main_frame().S(selector)
 
-    async def SS(selector):
-        return self.main_frame().SS(selector)
+    async def SS(self, selector):
+        return await self.main_frame().SS(selector)
+
+    async def SS_eval(self, selector, page_function, *args):
+        return await self.main_frame().SS_eval(
+            selector, page_function, *args)
+
+    async def evaluate(self, page_function, *args):
+        return await self.main_frame().evaluate(page_function, *args)
+
+    async def evaluate_handle(self, page_function, *args):
+        return await self.main_frame().evaluate_handle(page_function, *args)
+
+    def handle_scope(self):
+        return self.main_frame().handle_scope()
+
+    async def evaluate_many(self, items):
+        return await self.main_frame().evaluate_many(items)
 
     async def goto(self, url, options={}):
         watcher = NavigatorWatcher(
-            self._client, self._ignore_https_errors, options)
+            self._client, self._ignore_https_errors, options,
+            self._network_idle)
         responses = {}
 
+        await self._retain_navigation_domains()
         listener = Helper.add_event_listener(
             self._network_manager,
             NetworkManager.Events['Response'],
             self._get_scope(responses)
         )
-        result = watcher.wait_for_navigation()
-
-        referrer = self._network_manager.extra_http_headers().get(
-            'referer', '')
         try:
-            await self._client.send('Page.navigate', {
-                'url': url,
-                'referrer': referrer
-            })
-        except Exception as e:
-            watcher.cancel()
-            raise e
-        await result
-        Helper.remove_event_listeners([listener])
+            result = watcher.wait_for_navigation()
+            referrer = self._network_manager.extra_http_headers().get(
+                'referer', '')
+            try:
+                await self._client.send('Page.navigate', {
+                    'url': url,
+                    'referrer': referrer
+                })
+                await result
+            except Exception as e:
+                watcher.cancel()
+                raise e
+        finally:
+            Helper.remove_event_listeners([listener])
+            self._release_navigation_domains()
         if self._frame_manager.is_main_frame_loading_failed():
             raise Exception('Failed to navigate: {}'.format(url))
         return responses.get(self.main_frame().url(), None)
 
+    async def _retain_navigation_domains(self):
+        await self._client.require_domain('Page')
+        if not self._ignore_https_errors:
+            # Pinned, so the watcher's certificateError listener doesn't
+            # toggle Security on and off around every navigation.
+            await self._client.require_domain('Security')
+        # Network is only held for the navigation: it is needed to see the
+        # main document's response and for networkidle, but lazy mode
+        # shouldn't keep it on afterwards.
+        try:
+            await self._client.retain_domain('Network')
+        except Exception:
+            self._client.release_domain('Network')
+            raise
+
+    def _release_navigation_domains(self):
+        self._client.release_domain('Network')
+
     async def set_viewport(self, viewport={}):
         needs_reload = await self._emulation_manager.emulate_viewport(
             self._client, viewport)
@@ -194,30 +337,56 @@ class Page(EventEmitter):
     def viewport():
         return self._viewport
 
-    async def reload(options):
-        await self._client.send('Page.reload')
-        return await self.wait_for_navigation(options)
-
-    async def wait_for_navigation(self, options):
+    async def reload(self, options={}):
+        # Held here too, so the wait below doesn't have to turn Network on
+        # before its listeners are attached.
+        await self._retain_navigation_domains()
+        try:
+            navigation = asyncio.ensure_future(
+                self.wait_for_navigation(options))
+            try:
+                await self._client.send('Page.reload')
+            except Exception as e:
+                navigation.cancel()
+                raise e
+            return await navigation
+        finally:
+            self._release_navigation_domains()
+
+    async def wait_for_navigation(self, options={}):
+        await self._retain_navigation_domains()
         watcher = NavigatorWatcher(
-            self._client, self.ignore_https_errors, options)
+            self._client, self._ignore_https_errors, options,
+            self._network_idle)
         responses = {}
 
-        def set_resp(response):
-            global responses
-            responses[response['url']] = response
         listener = Helper.add_event_listener(
             self._network_manager,
             NetworkManager.Events['Response'],
-            set_resp
+            self._get_scope(responses)
         )
-        fut = await watcher.wait_for_navigation()
-        Helper.remove_event_listeners([listener])
+        try:
+            await watcher.wait_for_navigation()
+        except asyncio.CancelledError:
+            watcher.cancel()
+            raise
+        finally:
+            Helper.remove_event_listeners([listener])
+            self._release_navigation_domains()
         return responses.get(self.main_frame().url(), None)
 
+    async def wait_for_network_idle(self, options={}):
+        await self._client.require_domain('Network')
+        timeout = options['timeout'] if 'timeout' in options else 30000
+        idle = self._network_idle.wait(options)
+        try:
+            await asyncio.wait_for(idle, timeout / 1000 if timeout else None)
+        except asyncio.TimeoutError:
+            raise Exception(
+                'Network Idle Timeout Exceeded: {}ms exceeded'.format(timeout))
+
     async def screenshot(self, options={}):
         screenshot_type = None
-        print(options)
         if 'path' in options and options['path']:
             mime_type, enc = mimetypes.guess_type(options['path'])
             if mime_type == 'image/png':
@@ -241,19 +410,91 @@ class Page(EventEmitter):
             assert isinstance(options['clip']['y'], (int, float))
             assert isinstance(options['clip']['height'], (int, float))
             assert isinstance(options['clip']['width'], (int, float))
-        # return await self._screenshot_task_queue.post_task(
-        #     self._screenshot_task(
-        #         screenshot_type,
-        #         options
-        #     )
-        # )
-        res = await self._screenshot_task(screenshot_type, options)
-        return res
+        if 'encoding' in options:
+            assert options['encoding'] in [
+                'binary', 'memoryview', 'base64', None]
+        if 'tileHeight' in options and options['tileHeight']:
+            assert 'fullPage' in options and options['fullPage']
+            return await self._screenshot_stitched(screenshot_type, options)
+        return await self._screenshot_task_queue.post_task(
+            self,
+            lambda: self._screenshot_task(screenshot_type, options)
+        )
+
+    async def screenshot_tiles(self, options={}):
+        # Full page capture as a sequence of clip-sized tiles, so neither
+        # Chrome nor Python ever holds a bitmap of the whole page.
+        screenshot_type = options['type'] if 'type' in options else 'png'
+        assert screenshot_type in ['png', 'jpeg']
+        tile_height = options['tileHeight'] \
+            if 'tileHeight' in options else 4096
+        assert isinstance(tile_height, int) and tile_height > 0
+        tile_options = dict(options)
+        tile_options.pop('path', None)
+        tile_options.pop('stream', None)
+
+        metrics = await self._client.send('Page.getLayoutMetrics')
+        width = math.ceil(metrics['contentSize']['width'])
+        height = math.ceil(metrics['contentSize']['height'])
+        for y in range(0, height, tile_height):
+            clip = {
+                'x': 0,
+                'y': y,
+                'width': width,
+                'height': min(tile_height, height - y),
+                'scale': 1
+            }
+            data = await self._screenshot_task_queue.post_task(
+                self,
+                lambda: self._screenshot_tile_task(
+                    screenshot_type, clip, tile_options)
+            )
+            yield {
+                'x': 0,
+                'y': y,
+                'width': clip['width'],
+                'height': clip['height'],
+                'pageWidth': width,
+                'pageHeight': height,
+                'data': data
+            }
+
+    async def start_screencast(self, options={}):
+        if 'format' in options:
+            assert options['format'] in ['png', 'jpeg']
+        if 'quality' in options:
+            assert isinstance(options['quality'], int)
+            assert options['quality'] >= 0 and options['quality'] <= 100
+        if 'bufferSize' in options:
+            assert isinstance(options['bufferSize'], int)
+            assert options['bufferSize'] > 0
+        screencast = Screencast(self._client, options)
+        await screencast.start()
+        self._screencasts.add(screencast)
+        return screencast
+
+    async def _screenshot_stitched(self, _format, options):
+        if not Image:
+            raise Exception('Stitching screenshot tiles requires Pillow')
+        tile_options = dict(options)
+        tile_options['type'] = _format
+        tile_options['encoding'] = 'binary'
+        canvas = None
+        async for tile in self.screenshot_tiles(tile_options):
+            image = Image.open(io.BytesIO(tile['data']))
+            scale = image.size[0] / tile['width']
+            if canvas is None:
+                canvas = Image.new(image.mode, (
+                    image.size[0], math.ceil(tile['pageHeight'] * scale)))
+            canvas.paste(image, (0, round(tile['y'] * scale)))
+        output = io.BytesIO()
+        save_options = {}
+        if 'quality' in options:
+            save_options['quality'] = options['quality']
+        canvas.save(output, _format.upper(), **save_options)
+        return self._write_screenshot(output.getvalue(), options)
 
     async def _screenshot_task(self, _format, options={}):
-        await self._client.send('Target.activateTarget', {
-            'targetId': self._client.target_id()
-        })
         clip = options['clip'] if 'clip' in options else None
         if clip:
             clip['scale'] = 1
@@ -270,21 +511,40 @@ class Page(EventEmitter):
                 'height': height,
                 'scale': 1
             }
-            mobile = self._viewport['isMobile'] \
-                if 'isMobile' in self._viewport else False
-            device_scale_factor = self._viewport['deviceScaleFactor'] \
-                if 'deviceScaleFactor' in self._viewport else 1
-            landscape = self._viewport['isLandscape'] \
-                if 'isLandscape' in self._viewport else False
-            screen_orientation = {'angle': 90, 'type': 'landscapePrimary'} \
-                if landscape else {'angle': 0, 'type': 'portraitPrimary'}
-            await self._client.send('Emulation.setDeviceMetricsOverride', {
-                'mobile': mobile,
-                'width': width,
-                'height': height,
-                'deviceScaleFactor': device_scale_factor,
-                'screenOrientation': screen_orientation
-            })
+            await self._override_device_metrics(width, height)
+        data = await self._capture(_format, clip, options)
+        if 'fullPage' in options and options['fullPage']:
+            await self.set_viewport(self._viewport)
+        return self._write_screenshot(data, options)
+
+    async def _screenshot_tile_task(self, _format, clip, options):
+        # The viewport only needs to fit one tile; Chrome positions it over
+        # the clip. It is put back after every tile, as for full pages.
+        await self._override_device_metrics(clip['width'], clip['height'])
+        try:
+            data = await self._capture(_format, clip, options)
+        finally:
+            await self.set_viewport(self._viewport)
+        return self._write_screenshot(data, options)
+
+    async def _override_device_metrics(self, width, height):
+        mobile = self._viewport['isMobile'] \
+            if 'isMobile' in self._viewport else False
+        device_scale_factor = self._viewport['deviceScaleFactor'] \
+            if 'deviceScaleFactor' in self._viewport else 1
+        landscape = self._viewport['isLandscape'] \
+            if 'isLandscape' in self._viewport else False
+        screen_orientation = {'angle': 90, 'type': 'landscapePrimary'} \
+            if landscape else {'angle': 0, 'type': 'portraitPrimary'}
+        await self._client.send('Emulation.setDeviceMetricsOverride', {
+            'mobile': mobile,
+            'width': width,
+            'height': height,
+            'deviceScaleFactor': device_scale_factor,
+            'screenOrientation': screen_orientation
+        })
+
+    async def _capture(self, _format, clip, options):
         if 'omitBackground' in options and options['omitBackground']:
             await self._client.send(
                 'Emulation.setDefaultBackgroundColorOverride', {
@@ -298,29 +558,154 @@ class Page(EventEmitter):
             screenshot_data['quality'] = options['quality']
         if clip:
             screenshot_data['clip'] = clip
-        result = await self._client.send(
-            'Page.captureScreenshot', screenshot_data
-        )
-        print(result)
+        async with self._screenshot_task_queue.activation_lock():
+            await self._client.send('Target.activateTarget', {
+                'targetId': self._client.target_id()
+            })
+            result = await self._client.send(
+                'Page.captureScreenshot', screenshot_data
+            )
         if 'omitBackground' in options and options['omitBackground']:
             await self._client.send(
                 'Emulation.setDefaultBackgroundColorOverride'
             )
-        if 'fullPage' in options and options['fullPage']:
-            await self.set_viewport(self._viewport)
-        print(type(result['data']))
-        buffr = base64.decodebytes(bytes(result['data'], 'utf-8'))
-        if 'path' in options and options['path']:
-            with open(options['path'], 'wb') as fl:
-                fl.write(buffr)
+        return result.pop('data')
+
+    def _write_screenshot(self, data, options):
+        # `data` is the base64 string from the protocol, or the encoded
+        # image for stitched captures. Decode it in chunks so the image is
+        # never held more than once next to it.
+        encoding = options['encoding'] if 'encoding' in options \
+            else 'binary'
+        path = options['path'] if 'path' in options else None
+        stream = options['stream'] if 'stream' in options else None
+
+        if isinstance(data, bytes):
+            if path:
+                with open(path, 'wb') as fl:
+                    fl.write(data)
+            if stream:
+                stream.write(data)
+            if encoding == 'base64':
+                return binascii.b2a_base64(data, newline=False).decode()
+            if encoding == 'memoryview':
+                return memoryview(data)
+            return data if encoding else None
+
+        buffr = None
+        if encoding == 'binary':
+            buffr = binascii.a2b_base64(data)
+        elif encoding == 'memoryview':
+            buffr = bytearray(base64_decoded_size(data))
+        if not path and not stream and encoding != 'memoryview':
+            return data if encoding == 'base64' else buffr
+
+        fl = open(path, 'wb') if path else None
+        try:
+            if encoding == 'binary':
+                chunks = [buffr]
+            else:
+                chunks = base64_chunks(data)
+            offset = 0
+            for chunk in chunks:
+                if encoding == 'memoryview':
+                    buffr[offset:offset + len(chunk)] = chunk
+                    offset += len(chunk)
+                if fl:
+                    fl.write(chunk)
+                if stream:
+                    stream.write(chunk)
+        finally:
+            if fl:
+                fl.close()
+        if encoding == 'base64':
+            return data
+        if encoding == 'memoryview':
+            return memoryview(buffr)
         return buffr
 
     async def title(self):
         return await self.main_frame().title()
 
+    async def metrics(self):
+        await self._client.require_domain('Performance')
+        response = await self._client.send('Performance.getMetrics')
+        return {
+            metric['name']: metric['value']
+            for metric in response['metrics']
+        }
+
+    async def navigation_timing(self):
+        # Level 2 navigation timing where available, with paint entries and
+        # the legacy performance.timing as a fallback.
+        response = await self._client.send('Runtime.evaluate', {
+            'expression': '''(() => {
+                const result = {};
+                const [navigation] =
+                    performance.getEntriesByType('navigation');
+                if (navigation) {
+                    Object.assign(result, navigation.toJSON());
+                } else {
+                    const timing = performance.timing.toJSON();
+                    for (const name of Object.keys(timing))
+                        result[name] = timing[name] ?
+                            timing[name] - timing.navigationStart : 0;
+                }
+                for (const paint of performance.getEntriesByType('paint'))
+                    result[paint.name] = paint.startTime;
+                return result;
+            })()''',
+            'returnByValue': True
+        })
+        if 'exceptionDetails' in response:
+            raise Exception('Navigation timing is not available')
+        return response['result']['value']
+
+    def sample_metrics(self, options={}):
+        sampler = MetricsSampler(self, options)
+        sampler.start()
+        self._metrics_samplers.add(sampler)
+        return sampler
+
     @property
     def mouse(self):
         return self._mouse
 
+    def is_closed(self):
+        return self._closed or self._client.is_closed()
+
+    async def _reset(self):
+        # Bring a pooled tab back to the state Page.create leaves it in,
+        # only touching what the previous user changed.
+        self.remove_all_listeners()
+        if self._network_manager._request_interception_enabled:
+            await self.set_request_interception_enabled(False)
+        if self._network_manager.request_blocking_enabled():
+            await self.set_request_blocking({})
+        if self._network_manager.http_cache():
+            await self.set_http_cache(None)
+        await self._network_manager.close_body_captures()
+        if self._har.is_recording():
+            await self._har.stop()
+        if self._tracing.is_recording():
+            await self._tracing.stop()
+        await self._coverage._reset()
+        for screencast in list(self._screencasts):
+            await screencast.stop()
+        self._screencasts.clear()
+        for sampler in list(self._metrics_samplers):
+            await sampler.stop()
+        self._metrics_samplers.clear()
+        if self._network_manager.extra_http_headers():
+            await self.set_extra_http_headers({})
+        await self.goto('about:blank')
+        if self._viewport != Page.DefaultViewport:
+            await self.set_viewport(Page.DefaultViewport)
+
     async def close(self):
+        self._closed = True
+        if self._har.is_recording():
+            await self._har.stop()
+        await self._network_manager.close_body_captures()
+        self._network_idle.dispose()
         await self._client.dispose()
@@ -0,0 +1,66 @@
+import re
+
+
+class RequestBlocker(object):
+
+    # Rules are a dict of any of:
+    #   'resourceTypes': protocol resource types, e.g. ['Image', 'Font']
+    #   'urls': URL patterns with `*` as the only wildcard, like Chrome's
+    #           blocked URLs, e.g. ['*.woff2', '*://ads.example.com/*']
+    #   'domains': host names, blocking their subdomains too
+    #   'regexes': URL regular expressions
+    # A request matching any one rule is blocked.
+    def __init__(self, rules={}):
+        self._resource_types = frozenset(
+            rules['resourceTypes'] if 'resourceTypes' in rules else ())
+        self._urls = list(rules['urls'] if 'urls' in rules else ())
+        self._domains = [
+            domain.lower().strip('.')
+            for domain in (rules['domains'] if 'domains' in rules else ())
+        ]
+        self._regexes = list(rules['regexes'] if 'regexes' in rules else ())
+
+        # Globs and domains each fold into one regex matched against the
+        # whole URL, like Chrome's own blocked URL check. User regexes keep
+        # their own flags, so they are compiled and searched one by one.
+        self._url_matcher = None
+        if self._urls:
+            # Only `*` is a wildcard to Chrome; `?` and `[` are literal.
+            self._url_matcher = re.compile('|'.join(
+                re.escape(url).replace(r'\*', '.*') for url in self._urls),
+                re.S)
+        self._domain_matcher = None
+        if self._domains:
+            self._domain_matcher = re.compile(
+                r'[a-zA-Z][\w+.-]*://(?:[^/?#@]*@)?(?:[^/?#:]*\.)?'
+                r'(?:{})(?::\d+)?(?:[/?#].*)?'.format(
+                    '|'.join(re.escape(d) for d in self._domains)),
+                re.I | re.S)
+        self._regex_matchers = [re.compile(regex) for regex in self._regexes]
+
+    def is_empty(self):
+        return not self._resource_types and not self._url_matcher and \
+            not self._domain_matcher and not self._regex_matchers
+
+    def blocked_urls(self):
+        # Globs and domains Chrome can block on its own, before the request
+        # is ever reported to us.
+        urls = list(self._urls)
+        for domain in self._domains:
+            urls.append('*://{}/*'.format(domain))
+            urls.append('*://*.{}/*'.format(domain))
+        return urls
+
+    def needs_interception(self):
+        # Resource types and regexes can only be checked here, on
+        # intercepted requests.
+        return bool(self._resource_types or self._regexes)
+
+    def matches(self, url, resource_type=None):
+        if resource_type in self._resource_types:
+            return True
+        if self._url_matcher and self._url_matcher.fullmatch(url):
+            return True
+        if self._domain_matcher and self._domain_matcher.fullmatch(url):
+            return True
+        return any(regex.search(url) for regex in self._regex_matchers)
@@ -0,0 +1,88 @@
+import asyncio
+import binascii
+import collections
+
+from pyppeteer.helper import Helper
+
+
+class Screencast(object):
+
+    def __init__(self, client, options={}):
+        self._client = client
+        self._options = options
+        self._buffer_size = options['bufferSize'] \
+            if 'bufferSize' in options else 2
+        self._frames = collections.deque()
+        # Chrome sends the next frame only once the previous one is acked,
+        # so holding back the ack while the buffer is full stalls capture
+        # instead of piling frames up in memory.
+        self._unacked = None
+        self._waiter = None
+        self._listener = None
+        self._stopped = False
+
+    async def start(self):
+        params = {
+            'format': self._options['format']
+            if 'format' in self._options else 'jpeg'
+        }
+        for option in ('quality', 'maxWidth', 'maxHeight', 'everyNthFrame'):
+            if option in self._options:
+                params[option] = self._options[option]
+        self._listener = Helper.add_event_listener(
+            self._client, 'Page.screencastFrame', self._on_frame)
+        await self._client.send('Page.startScreencast', params)
+
+    async def stop(self):
+        if self._stopped:
+            return
+        self._stopped = True
+        Helper.remove_event_listeners([self._listener])
+        self._wake()
+        await self._client.send('Page.stopScreencast')
+
+    def _on_frame(self, event):
+        if self._stopped:
+            return
+        self._frames.append(event)
+        if len(self._frames) <= self._buffer_size:
+            self._ack(event['sessionId'])
+        else:
+            self._unacked = event['sessionId']
+        self._wake()
+
+    def _ack(self, session_id):
+        future = asyncio.ensure_future(
+            self._client.send('Page.screencastFrameAck', {
+                'sessionId': session_id
+            }))
+        future.add_done_callback(
+            lambda fut: fut.cancelled() or fut.exception())
+
+    def _wake(self):
+        if self._waiter and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._frames:
+            if self._stopped:
+                raise StopAsyncIteration
+            self._waiter = asyncio.Future()
+            await self._waiter
+        event = self._frames.popleft()
+        if self._unacked and len(self._frames) <= self._buffer_size:
+            self._ack(self._unacked)
+            self._unacked = None
+        return {
+            'data': binascii.a2b_base64(event['data']),
+            'metadata': event['metadata']
+        }
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
@@ -0,0 +1,97 @@
+import asyncio
+import collections
+import time
+
+
+class ScreenshotScheduler(object):
+
+    def __init__(self, concurrency=4):
+        self._concurrency = concurrency
+        # Pending tasks per page, in round-robin order of the pages.
+        self._queues = collections.OrderedDict()
+        self._busy = set()
+        self._running = 0
+        # Activating a target and capturing it must not interleave with
+        # another page doing the same, everything else can overlap.
+        self._activation_lock = asyncio.Lock()
+
+        self._completed = 0
+        self._failed = 0
+        self._queue_wait_total = 0
+        self._queue_wait_max = 0
+        self._capture_time_total = 0
+        self._capture_time_max = 0
+
+    def activation_lock(self):
+        return self._activation_lock
+
+    async def post_task(self, key, task):
+        future = asyncio.Future()
+        if key not in self._queues:
+            self._queues[key] = collections.deque()
+        self._queues[key].append((task, future, time.monotonic()))
+        self._pump()
+        return await future
+
+    def metrics(self):
+        done = self._completed + self._failed
+        return {
+            'queued': sum(len(queue) for queue in self._queues.values()),
+            'running': self._running,
+            'completed': self._completed,
+            'failed': self._failed,
+            'queueWaitMean': self._queue_wait_total / done if done else 0,
+            'queueWaitMax': self._queue_wait_max,
+            'captureTimeMean': self._capture_time_total / done if done else 0,
+            'captureTimeMax': self._capture_time_max,
+        }
+
+    def _pump(self):
+        while self._running < self._concurrency:
+            key = self._next_key()
+            if key is None:
+                return
+            queue = self._queues[key]
+            task, future, queued_at = queue.popleft()
+            if not queue:
+                del self._queues[key]
+            if future.cancelled():
+                continue
+            self._busy.add(key)
+            self._running += 1
+            asyncio.ensure_future(self._run(key, task, future, queued_at))
+
+    def _next_key(self):
+        # A page runs one task at a time, so viewport changes made for a
+        # full page capture never race with another capture of that page.
+        for key in self._queues:
+            if key not in self._busy:
+                return key
+        return None
+
+    async def _run(self, key, task, future, queued_at):
+        started = time.monotonic()
+        try:
+            result = await task()
+        except Exception as e:
+            self._failed += 1
+            if not future.cancelled():
+                future.set_exception(e)
+        else:
+            self._completed += 1
+            if not future.cancelled():
+                future.set_result(result)
+        finally:
+            # Timings are reported in milliseconds like the other options.
+            queue_wait = (started - queued_at) * 1000
+            capture_time = (time.monotonic() - started) * 1000
+            self._queue_wait_total += queue_wait
+            self._queue_wait_max = max(self._queue_wait_max, queue_wait)
+            self._capture_time_total += capture_time
+            self._capture_time_max = max(self._capture_time_max, capture_time)
+            self._busy.discard(key)
+            self._running -= 1
+            if key in self._queues:
+                # Let every other waiting page go before this one again.
+                self._queues.move_to_end(key)
+            self._pump()
@@ -0,0 +1,104 @@
+import asyncio
+import collections
+import hashlib
+
+STALE_HANDLE_ERRORS = (
+    'Could not find object with given id',
+    'Cannot find context with specified id',
+    'Execution context was destroyed',
+)
+
+
+class ScriptCache(object):
+
+    ObjectGroup = 'pyppeteer-script-cache'
+
+    # Calls a page function through a handle to the function compiled once
+    # per execution context, so repeat calls only send a fixed wrapper and
+    # the arguments instead of the whole source.
+    def __init__(self, client, hot_threshold=2, max_entries=256):
+        self._client = client
+        self._hot_threshold = hot_threshold
+        self._max_entries = max_entries
+        # context id -> {digest: function objectId}, least recent first.
+        self._handles = {}
+        # digest -> times seen, bounded the same way.
+        self._seen = collections.OrderedDict()
+
+    @staticmethod
+    def digest(source):
+        return hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+    def is_hot(self, source):
+        # One-off functions are cheaper to just evaluate; only sources that
+        # keep coming back are worth a handle.
+        digest = ScriptCache.digest(source)
+        count = self._seen.pop(digest, 0) + 1
+        self._seen[digest] = count
+        if len(self._seen) > self._max_entries * 4:
+            self._seen.popitem(last=False)
+        return count >= self._hot_threshold
+
+    async def call(
+            self, context_id, source, args, return_by_value,
+            object_group=None):
+        # Returns the Runtime.callFunctionOn response, or None when the
+        # function could not be called through the cache and nothing ran.
+        digest = ScriptCache.digest(source)
+        handles = self._handles.get(context_id)
+        if handles is None:
+            handles = self._handles[context_id] = collections.OrderedDict()
+        object_id = handles.get(digest)
+        if object_id is None:
+            try:
+                res = await self._client.send('Runtime.evaluate', {
+                    'expression': '({})'.format(source),
+                    'contextId': context_id,
+                    'objectGroup': ScriptCache.ObjectGroup
+                })
+            except Exception:
+                return None
+            if 'exceptionDetails' in res and res['exceptionDetails'] or \
+                    'objectId' not in res['result']:
+                return None
+            object_id = res['result']['objectId']
+            # The context may have gone away while compiling.
+            if self._handles.get(context_id) is handles:
+                handles[digest] = object_id
+                if len(handles) > self._max_entries:
+                    _, evicted = handles.popitem(last=False)
+                    self._release(evicted)
+        else:
+            handles.move_to_end(digest)
+        params = {
+            'objectId': object_id,
+            'functionDeclaration':
+                'function(...args) { return this(...args); }',
+            'arguments': [{'value': arg} for arg in args],
+            'returnByValue': return_by_value,
+            'awaitPromise': True
+        }
+        if object_group:
+            params['objectGroup'] = object_group
+        try:
+            return await self._client.send('Runtime.callFunctionOn', params)
+        except Exception as e:
+            # Only errors saying the handle or its context is gone mean
+            # nothing ran. Others, like a result that can't be returned by
+            # value, come after the call and must not trigger a rerun.
+            if not any(reason in str(e) for reason in STALE_HANDLE_ERRORS):
+                raise
+            handles.pop(digest, None)
+            return None
+
+    def invalidate(self, context_id):
+        self._handles.pop(context_id, None)
+
+    def clear(self):
+        self._handles.clear()
+
+    def _release(self, object_id):
+        future = asyncio.ensure_future(self._client.send(
+            'Runtime.releaseObject', {'objectId': object_id}))
+        future.add_done_callback(
+            lambda fut: fut.cancelled() or fut.exception())
@@ -1,6 +1,125 @@
+import asyncio
+import binascii
+
+from pyppeteer.helper import Helper
+
+DEFAULT_CATEGORIES = (
+    '-*',
+    'devtools.timeline',
+    'v8.execute',
+    'disabled-by-default-devtools.timeline',
+    'disabled-by-default-devtools.timeline.frame',
+    'toplevel',
+    'blink.console',
+    'blink.user_timing',
+    'latencyInfo',
+    'disabled-by-default-devtools.timeline.stack',
+    'disabled-by-default-v8.cpu_profiler',
+    'disabled-by-default-v8.cpu_profiler.hires',
+)
+
+
 class Tracing(object):
 
+    Presets = {
+        'default': DEFAULT_CATEGORIES,
+        'rendering': (
+            '-*',
+            'devtools.timeline',
+            'disabled-by-default-devtools.timeline',
+            'disabled-by-default-devtools.timeline.frame',
+            'disabled-by-default-devtools.timeline.invalidationTracking',
+            'toplevel',
+            'blink',
+            'cc',
+            'gpu',
+            'latencyInfo',
+        ),
+        'network': (
+            '-*',
+            'devtools.timeline',
+            'toplevel',
+            'loading',
+            'navigation',
+            'netlog',
+            'disabled-by-default-netlog',
+        ),
+        'js': (
+            '-*',
+            'devtools.timeline',
+            'toplevel',
+            'v8',
+            'v8.execute',
+            'blink.user_timing',
+            'disabled-by-default-devtools.timeline.stack',
+            'disabled-by-default-v8.cpu_profiler',
+            'disabled-by-default-v8.cpu_profiler.hires',
+        ),
+    }
+
     def __init__(self, client):
         self._client = client
         self._recording = False
         self._path = ''
+        self._chunk_size = None
+
+    def is_recording(self):
+        return self._recording
+
+    async def start(self, options={}):
+        assert not self._recording, \
+            'Cannot start recording trace while already recording trace.'
+        assert 'path' in options, 'Must specify a path to write trace file to.'
+        if 'categories' in options:
+            categories = list(options['categories'])
+        else:
+            categories = list(Tracing.Presets[
+                options['preset'] if 'preset' in options else 'default'])
+        if 'screenshots' in options and options['screenshots']:
+            categories.append('disabled-by-default-devtools.screenshot')
+        self._path = options['path']
+        self._chunk_size = options['chunkSize'] \
+            if 'chunkSize' in options else None
+        await self._client.send('Tracing.start', {
+            'transferMode': 'ReturnAsStream',
+            'categories': ','.join(categories)
+        })
+        self._recording = True
+
+    async def stop(self):
+        assert self._recording, 'Tracing is not started.'
+        complete = asyncio.Future()
+
+        def on_complete(event):
+            if not complete.done():
+                complete.set_result(event['stream'])
+        listener = Helper.add_event_listener(
+            self._client, 'Tracing.tracingComplete', on_complete)
+        try:
+            await self._client.send('Tracing.end')
+            self._recording = False
+            handle = await complete
+        finally:
+            Helper.remove_event_listeners([listener])
+        await self._read_stream(handle, self._path)
+        return self._path
+
+    async def _read_stream(self, handle, path):
+        # The trace is pulled through IO.read one chunk at a time and written
+        # straight out, so a large trace is never held in memory.
+        params = {'handle': handle}
+        if self._chunk_size:
+            params['size'] = self._chunk_size
+        try:
+            with open(path, 'wb') as fl:
+                while True:
+                    response = await self._client.send('IO.read', params)
+                    if 'base64Encoded' in response and \
+                            response['base64Encoded']:
+                        fl.write(binascii.a2b_base64(response['data']))
+                    else:
+                        fl.write(response['data'].encode('utf-8'))
+                    if response['eof']:
+                        break
+        finally:
+            await self._client.send('IO.close', {'handle': handle})